@@ -0,0 +1,91 @@
+"""
+AI Person Counter Annotator
+
+Renders the annotated output video after counting, from the source video and
+the tracks recorded with `counter.py --tracks_output`.
+
+Created by: Pratik Das
+Date: 2026-10-18
+Version: 1.0
+"""
+
+import os
+import argparse
+
+from counter import get_crop, get_position
+from track_recorder import read_tracks
+
+def parse_arguments(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Render the annotated video from recorded tracks')
+    parser.add_argument('video', type=str, help='Path to input video')
+    parser.add_argument('tracks', type=str, help='Path to the tracks CSV recorded by counter.py')
+    parser.add_argument('door_dir', type=str, choices=["up", "down", "left", "right"], help='Direction of the Door')
+    parser.add_argument('--output', type=str, required=True, help='Path to output video')
+    parser.add_argument('--crop', action='store_true', default=False, help='Crop video as it was cropped while counting')
+    return parser.parse_args(argv)
+
+def render_video(args):
+    """Replay the video and draw the recorded tracks and counts on it"""
+    import cv2
+    from tqdm import tqdm
+    from annotator import Annotator
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {args.video}")
+        return
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    if args.crop:
+        crop_top, crop_bottom, crop_left, crop_right = get_crop(frame_width, frame_height)
+        frame_width = frame_width // 2
+        frame_height = frame_height // 2
+
+    position = get_position(args.door_dir, frame_width, frame_height)
+    annotator = Annotator(frame_width, frame_height, position, total_frames)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    out = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height))
+
+    # Trails are rebuilt from the recorded positions, like PersonTracker.track_history
+    track_history = {}
+    frame_count = 0
+    for recorded_frame, counts, tracks in tqdm(read_tracks(args.tracks), desc="Rendering frames"):
+        # Frames that were skipped while counting are not in the output, seek past them without decoding
+        while frame_count < recorded_frame - 1:
+            if not cap.grab():
+                break
+            frame_count += 1
+
+        success, frame = cap.read()
+        if not success:
+            break
+        frame_count += 1
+
+        if args.crop:
+            frame = frame[crop_top:crop_bottom, crop_left:crop_right]
+
+        track_ids = []
+        for track_id, x, y in tracks:
+            history = track_history.setdefault(track_id, [])
+            history.append((x, y))
+            del history[:-10]
+            track_ids.append(track_id)
+
+        annotator.draw(frame, frame_count, counts, track_ids, track_history)
+        out.write(frame)
+
+    cap.release()
+    out.release()
+    print(f"Output video saved to {args.output}")
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    render_video(args)
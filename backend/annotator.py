@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+def draw_boundary(frame, position):
+    """Draw the boundary line and the inside/outside labels"""
+    frame_height, frame_width = frame.shape[:2]
+    mid_height = frame_height // 2
+    mid_width = frame_width // 2
+    
+    if position.line_orientation == "horizontal":
+        cv2.line(frame, (0, mid_height), (frame_width, mid_height), (255, 0, 0), 2)
+        quater_height = frame_height // 4
+        if position.door_direction == "down":
+            cv2.putText(frame, "Outside", (mid_width, mid_height - quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            cv2.putText(frame, "Inside", (mid_width, mid_height + quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        elif position.door_direction == "up":
+            cv2.putText(frame, "Outside", (mid_width, mid_height + quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            cv2.putText(frame, "Inside", (mid_width, mid_height - quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    elif position.line_orientation == "vertical":
+        cv2.line(frame, (mid_width, 0), (mid_width, frame_height), (255, 0, 0), 2)
+        quater_width = frame_width // 4
+        if position.door_direction == "right":
+            cv2.putText(frame, "Outside", (mid_width - quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            cv2.putText(frame, "Inside", (mid_width + quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        elif position.door_direction == "left":
+            cv2.putText(frame, "Outside", (mid_width + quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            cv2.putText(frame, "Inside", (mid_width - quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    
+    return frame
+
+def draw_tracks(frame, track_ids, track_history):
+    """Draw the center, ID and recent trail of each active track"""
+    for track_id in track_ids:
+        center_x, center_y = track_history[track_id][-1]
+        cv2.circle(frame, (center_x, center_y), 5, (0, 255, 0), -1)
+        cv2.putText(frame, f"{track_id}", (center_x - 20, center_y - 0), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        
+        points = np.hstack(track_history[track_id][-10:]).astype(np.int32).reshape((-1, 1, 2))
+        cv2.polylines(frame, [points], isClosed=False, color=(0, 255, 0), thickness=2)
+    
+    return frame
+
+class Annotator:
+    """Draws the counting overlays on frames
+    
+    The boundary line and labels never change, so they are rendered once into
+    a sparse pixel list and copied onto each frame. The count text is only
+    rebuilt when the counts change.
+    """
+    def __init__(self, frame_width, frame_height, position, total_frames=None):
+        canvas = np.zeros((frame_height, frame_width, 3), dtype=np.uint8)
+        draw_boundary(canvas, position)
+        self.overlay_ys, self.overlay_xs = np.nonzero(canvas.any(axis=2))
+        self.overlay_pixels = canvas[self.overlay_ys, self.overlay_xs]
+        
+        self.frame_height = frame_height
+        self.frame_label = f"/{total_frames}" if total_frames else ""
+        self._counts = None
+        self._count_text = ""
+    
+    def draw_static(self, frame):
+        """Copy the pre-rendered boundary line and labels onto a frame"""
+        frame[self.overlay_ys, self.overlay_xs] = self.overlay_pixels
+        return frame
+    
+    def draw_dynamic(self, frame, frame_count, counts, track_ids, track_history):
+        """Draw the tracks, counts and frame number"""
+        draw_tracks(frame, track_ids, track_history)
+        
+        if counts != self._counts:
+            self._counts = counts.copy()
+            self._count_text = f"Total: {counts['total']} | In: {counts['incoming']} | Out: {counts['outgoing']}"
+        cv2.putText(frame, self._count_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
+        
+        cv2.putText(frame, f"Frame: {frame_count}{self.frame_label}", (10, self.frame_height - 20), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+        return frame
+    
+    def draw(self, frame, frame_count, counts, track_ids, track_history):
+        """Draw all overlays on a frame"""
+        self.draw_static(frame)
+        return self.draw_dynamic(frame, frame_count, counts, track_ids, track_history)
@@ -0,0 +1,184 @@
+"""
+AI Forecast Backtester
+
+Replays count history with rolling forecast origins and compares forecast
+models on accuracy (MAE/WAPE), fit/predict wall time and peak memory.
+
+Created by: Pratik Das
+Date: 2026-10-18
+Version: 1.0
+"""
+
+import os
+import sys
+import time
+import argparse
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+
+import forecast
+
+TARGET_COLS = ['incoming_last_interval', 'outgoing_last_interval']
+MODEL_CHOICES = ['random_forest', 'random_forest_lags', 'hist_gradient_boosting', 'simple_average']
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Backtest forecast models with rolling forecast origins')
+    parser.add_argument('csv', type=str, nargs='+', help='Path(s) to the count CSV file(s)')
+    parser.add_argument('--models', type=str, nargs='+', default=MODEL_CHOICES, choices=MODEL_CHOICES, help='Models to compare')
+    parser.add_argument('--n_estimators', type=int, nargs='+', default=[100, 500], help='Tree/iteration counts to compare for tree models')
+    parser.add_argument('--origins', type=int, default=14, help='Number of most recent days used as forecast origins')
+    parser.add_argument('--min_train_days', type=int, default=7, help='Minimum days of history before the first origin')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of origins evaluated in parallel')
+    parser.add_argument('--output', type=str, default=None, help='Path to save the per-origin results CSV (optional)')
+    return parser.parse_args()
+
+def get_model_specs(models, n_estimators_list):
+    """Expand model names into (label, name, n_estimators) specs"""
+    specs = []
+    for name in models:
+        if name == 'simple_average':
+            specs.append((name, name, None))
+        else:
+            for n_estimators in n_estimators_list:
+                specs.append((f'{name}[n={n_estimators}]', name, n_estimators))
+    return specs
+
+def get_origins(df_working, n_origins, min_train_days):
+    """Pick the last n days with enough history as forecast origins"""
+    days = sorted(df_working['timestamp'].dt.normalize().unique())
+    return [pd.Timestamp(day) for day in days[min_train_days:][-n_origins:]]
+
+def run_model(spec, df_train, forecast_timestamps, target_col, n_jobs):
+    """Fit and forecast one column, returning predictions and timings"""
+    label, name, n_estimators = spec
+    timings = {'fit': 0.0, 'predict': 0.0}
+
+    if name == 'simple_average':
+        start = time.perf_counter()
+        predictions = forecast.forecast_simple_average(df_train[target_col].values, len(forecast_timestamps))
+        timings['predict'] = time.perf_counter() - start
+        return predictions, timings
+
+    model_name = 'random_forest' if name == 'random_forest_lags' else name
+    model = forecast.make_regressor(model_name, n_estimators, n_jobs=n_jobs)
+    predictions = forecast.forecast_regressor(
+        df_train[['timestamp', target_col]],
+        target_col,
+        forecast_timestamps,
+        model,
+        use_lags=name == 'random_forest_lags',
+        timings=timings,
+        verbose=False
+    )
+    if predictions is None:
+        # Same fallback as the CLI when a model cannot be trained
+        predictions = forecast.forecast_simple_average(df_train[target_col].values, len(forecast_timestamps))
+    return predictions, timings
+
+def evaluate_origin(df_working, origin, spec, n_jobs=1):
+    """Train on history before the origin and score the forecast of the origin day"""
+    df_train = df_working[df_working['timestamp'] < origin].reset_index(drop=True)
+    df_actual = df_working[(df_working['timestamp'] >= origin) &
+                           (df_working['timestamp'] < origin + pd.Timedelta(days=1))]
+    forecast_timestamps = list(df_actual['timestamp'])
+
+    record = {'model': spec[0], 'origin': origin.date().isoformat(), 'hours': len(forecast_timestamps),
+              'fit_s': 0.0, 'predict_s': 0.0, 'abs_error': 0.0, 'actual': 0.0}
+    for col in TARGET_COLS:
+        predictions, timings = run_model(spec, df_train, forecast_timestamps, col, n_jobs)
+        actual = df_actual[col].values
+        record['fit_s'] += timings['fit']
+        record['predict_s'] += timings['predict']
+        record['abs_error'] += float(np.abs(predictions - actual).sum())
+        record['actual'] += float(np.abs(actual).sum())
+
+    return record
+
+def measure_peak_memory(df_working, origin, spec, n_jobs=1):
+    """Peak RSS growth in MB while evaluating one origin
+
+    RSS includes the native allocations of scikit-learn (e.g. tree nodes),
+    which tracemalloc does not see. ru_maxrss only ever grows, so this runs
+    in a fresh process where earlier models cannot hide the peak.
+    """
+    import resource
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    evaluate_origin(df_working, origin, spec, n_jobs)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return (peak - before) / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def summarize(results, memory):
+    """Aggregate per-origin records into one row per model"""
+    df = pd.DataFrame(results)
+    summary = df.groupby('model', sort=False).agg(
+        origins=('origin', 'count'),
+        hours=('hours', 'sum'),
+        abs_error=('abs_error', 'sum'),
+        actual=('actual', 'sum'),
+        fit_s=('fit_s', 'mean'),
+        predict_s=('predict_s', 'mean'),
+    )
+    summary['mae'] = summary['abs_error'] / (summary['hours'] * len(TARGET_COLS))
+    summary['wape'] = summary['abs_error'] / summary['actual'].replace(0, np.nan)
+    summary['peak_mb'] = pd.Series(memory)
+    return summary[['origins', 'mae', 'wape', 'fit_s', 'predict_s', 'peak_mb']]
+
+def limit_threads():
+    """Process pool initializer: one OpenMP/BLAS thread per worker, HistGradientBoosting ignores n_jobs"""
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[name] = "1"
+    # Runtimes loaded before the worker started (inherited by fork) ignore the variables and are
+    # capped directly, scikit-learn is imported first so its OpenMP runtime is among them
+    import sklearn.ensemble  # noqa: F401 -- imported only to load its OpenMP runtime before limiting it
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+
+def backtest(input_csvs, models, n_estimators_list, n_origins, min_train_days, workers):
+    """Run all models over all rolling origins"""
+    df_working = forecast.load_working_hours(input_csvs)
+    origins = get_origins(df_working, n_origins, min_train_days)
+    if not origins:
+        raise ValueError(f"Not enough history: need more than {min_train_days} days of data")
+
+    specs = get_model_specs(models, n_estimators_list)
+    print(f"\nBacktesting {len(specs)} models over {len(origins)} origins "
+          f"({origins[0].date()} to {origins[-1].date()}) with {workers} workers")
+
+    # Origins run in parallel, so each model is kept single-threaded to avoid oversubscription
+    n_jobs = 1 if workers > 1 else -1
+    initializer = limit_threads if workers > 1 else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as executor:
+        futures = [executor.submit(evaluate_origin, df_working, origin, spec, n_jobs)
+                   for spec in specs for origin in origins]
+        results = [future.result() for future in futures]
+
+    # Peak memory is measured on the largest training set, one fresh process per model
+    with multiprocessing.get_context('spawn').Pool(workers, initializer=initializer, maxtasksperchild=1) as pool:
+        memory_results = {spec[0]: pool.apply_async(measure_peak_memory, (df_working, origins[-1], spec, n_jobs))
+                          for spec in specs}
+        memory = {label: result.get() for label, result in memory_results.items()}
+
+    return results, summarize(results, memory)
+
+if __name__ == '__main__':
+    warnings.filterwarnings('ignore')
+    args = parse_arguments()
+
+    try:
+        results, summary = backtest(args.csv, args.models, args.n_estimators, args.origins,
+                                    args.min_train_days, args.workers)
+        print("\nBacktest summary:")
+        print(summary.to_string(float_format=lambda v: f"{v:.4f}"))
+
+        if args.output:
+            pd.DataFrame(results).to_csv(args.output, index=False)
+            print(f"\n✓ Per-origin results saved to: {args.output}")
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
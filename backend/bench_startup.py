@@ -0,0 +1,93 @@
+"""
+CLI Startup Benchmark
+
+Measures the per-invocation overhead of the counter and forecast CLIs, which
+the server starts as subprocesses for every job.
+
+Created by: Pratik Das
+Date: 2026-10-18
+Version: 1.0
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# Commands timed by default, relative to the backend directory
+DEFAULT_COMMANDS = {
+    'counter --help': ['counter.py', '--help'],
+    'forecast --help': ['forecast.py', '--help'],
+    'import counter': ['-c', 'import counter'],
+    'import forecast': ['-c', 'import forecast'],
+}
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup time')
+    parser.add_argument('--runs', type=int, default=10, help='Number of timed runs per command')
+    parser.add_argument('--forecast_csv', type=str, default=None, help='Also time a headless forecast run on this CSV')
+    parser.add_argument('--importtime', action='store_true', default=False, help='Show the slowest imports of each command')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to show')
+    parser.add_argument('--output', type=str, default=None, help='Path to save results as JSON (optional)')
+    return parser.parse_args()
+
+def time_command(cmd, runs):
+    """Run a command several times and return wall times in seconds"""
+    # One untimed run to warm the filesystem and bytecode caches
+    subprocess.run([sys.executable] + cmd, capture_output=True)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + cmd, capture_output=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{result.stderr.decode()}")
+    return timings
+
+def slowest_imports(cmd, top):
+    """Return the slowest top-level imports of a command from `-X importtime`"""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + cmd, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only top-level imports, nested ones are included in their parent
+        if len(name) - len(name.lstrip()) == 1:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    commands = dict(DEFAULT_COMMANDS)
+    if args.forecast_csv:
+        commands['forecast --chart none'] = ['forecast.py', args.forecast_csv, '--chart', 'none',
+                                             '--output', os.devnull, '--n_estimators', '10']
+
+    results = {}
+    print(f"{'command':<24}{'min [ms]':>10}{'median [ms]':>13}{'mean [ms]':>11}")
+    for label, cmd in commands.items():
+        timings = time_command(cmd, args.runs)
+        results[label] = {
+            'min_ms': min(timings) * 1000,
+            'median_ms': statistics.median(timings) * 1000,
+            'mean_ms': statistics.mean(timings) * 1000,
+        }
+        print(f"{label:<24}{results[label]['min_ms']:>10.1f}{results[label]['median_ms']:>13.1f}{results[label]['mean_ms']:>11.1f}")
+
+        if args.importtime:
+            results[label]['slowest_imports'] = slowest_imports(cmd, args.top)
+            for cumulative, name in results[label]['slowest_imports']:
+                print(f"    {cumulative / 1000:>8.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
@@ -0,0 +1,216 @@
+"""
+Counting Throughput Benchmark
+
+Generates synthetic doorway videos with known crossings and runs the counter
+under the main configurations, recording fps, per-frame latency, peak RSS and
+count error in a JSON file that can be compared against a previous run.
+
+Created by: Pratik Das
+Date: 2026-10-18
+Version: 1.0
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+
+# Configurations benchmarked by default: counter.py arguments and whether the output video is written
+DEFAULT_CONFIGS = {
+    'default': {'args': [], 'output': True},
+    'skip_frames_2': {'args': ['--skip_frames', '2'], 'output': True},
+    'adaptive': {'args': ['--adaptive'], 'output': True},
+    'crop': {'args': ['--crop'], 'output': True},
+    'no_output': {'args': [], 'output': False},
+    'bytetrack': {'args': ['--tracker', 'bytetrack.yaml'], 'output': True},
+}
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark counting throughput on synthetic doorway videos')
+    parser.add_argument('--resolutions', type=str, nargs='+', default=['1280x720'], help='Video resolutions (WIDTHxHEIGHT)')
+    parser.add_argument('--seconds', type=int, default=60, help='Length of each synthetic video in seconds')
+    parser.add_argument('--fps', type=int, default=30, help='Frame rate of the synthetic videos')
+    parser.add_argument('--density', type=float, default=10, help='People crossing per minute')
+    parser.add_argument('--configs', type=str, nargs='+', default=list(DEFAULT_CONFIGS), choices=list(DEFAULT_CONFIGS), help='Configurations to run')
+    parser.add_argument('--model', type=str, default=None, help='Path to YOLO model (default: counter.py default)')
+    parser.add_argument('--output', type=str, default='bench_results.json', help='Path to save the results JSON')
+    parser.add_argument('--baseline', type=str, default=None, help='Previous results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative fps drop before flagging a regression')
+    parser.add_argument('--run_one', type=str, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def draw_person(frame, center_x, center_y, height, color):
+    """Draw a simple person-shaped sprite centered on a point"""
+    import cv2
+
+    head = max(height // 8, 2)
+    body_top = center_y - height // 2 + 2 * head
+    body_bottom = center_y + height // 8
+    half_width = max(height // 7, 2)
+    cv2.circle(frame, (center_x, center_y - height // 2 + head), head, (180, 200, 230), -1)
+    cv2.rectangle(frame, (center_x - half_width, body_top), (center_x + half_width, body_bottom), color, -1)
+    cv2.line(frame, (center_x - half_width // 2, body_bottom), (center_x - half_width, center_y + height // 2), (60, 60, 60), max(half_width // 2, 1))
+    cv2.line(frame, (center_x + half_width // 2, body_bottom), (center_x + half_width, center_y + height // 2), (60, 60, 60), max(half_width // 2, 1))
+
+def generate_video(video_path, width, height, fps, seconds, density, seed=42):
+    """Write a synthetic doorway video and return its ground-truth counts
+
+    People walk vertically across the middle of the frame. The door is "up"
+    (outside is the bottom half), so walking upwards is an incoming crossing.
+    """
+    import cv2
+    import numpy as np
+
+    rng = random.Random(seed)
+    total_frames = fps * seconds
+    sprite_height = height // 5
+    travel_frames = int(fps * 4)  # 4 seconds from edge to edge
+
+    # Schedule crossings at the requested density
+    people = []
+    n_people = int(density * seconds / 60)
+    for _ in range(n_people):
+        start = rng.randint(0, max(total_frames - travel_frames, 0))
+        upwards = rng.random() < 0.5
+        x = rng.randint(int(width * 0.35), int(width * 0.65))
+        color = tuple(rng.randint(40, 220) for _ in range(3))
+        people.append((start, upwards, x, color))
+
+    background = np.full((height, width, 3), 110, dtype=np.uint8)
+    noise = np.random.default_rng(seed).integers(0, 20, (height, width, 1), dtype=np.uint8)
+    background = cv2.add(background, np.repeat(noise, 3, axis=2))
+    cv2.rectangle(background, (int(width * 0.3), 0), (int(width * 0.7), height), (150, 140, 130), -1)
+
+    out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    top, bottom = int(height * 0.1), int(height * 0.9)
+    for frame_idx in range(total_frames):
+        frame = background.copy()
+        for start, upwards, x, color in people:
+            progress = (frame_idx - start) / travel_frames
+            if 0 <= progress <= 1:
+                y = bottom + (top - bottom) * progress if upwards else top + (bottom - top) * progress
+                draw_person(frame, x, int(y), sprite_height, color)
+        out.write(frame)
+    out.release()
+
+    incoming = sum(1 for _, upwards, _, _ in people if upwards)
+    return {'incoming': incoming, 'outgoing': n_people - incoming}
+
+def run_one(spec):
+    """Run one configuration in this process and return its measurements"""
+    import resource
+    import counter
+
+    config = DEFAULT_CONFIGS[spec['config']]
+    argv = [spec['video'], 'up', '--csv_output', spec['csv_output'], '--stats'] + config['args']
+    if config['output']:
+        argv += ['--output', spec['output']]
+    if spec['model']:
+        argv += ['--model', spec['model']]
+
+    args = counter.parse_arguments(argv)
+    start = time.perf_counter()
+    results = counter.process_video(args)
+    wall_time = time.perf_counter() - start
+
+    frame_timings = results['timings'].get('frame', {})
+    counts = results['counts']
+    truth = spec['ground_truth']
+    return {
+        'wall_s': wall_time,
+        'frames': results['frames'],
+        'fps': results['frames'] / wall_time if wall_time else 0,
+        'latency_p50_ms': frame_timings.get('p50_ms'),
+        'latency_p95_ms': frame_timings.get('p95_ms'),
+        'latency_p99_ms': frame_timings.get('p99_ms'),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        'incoming': counts['incoming'],
+        'outgoing': counts['outgoing'],
+        'count_error': abs(counts['incoming'] - truth['incoming']) + abs(counts['outgoing'] - truth['outgoing']),
+    }
+
+def run_config(spec):
+    """Run one configuration in a fresh subprocess so peak RSS is per run"""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--run_one', json.dumps(spec)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed:\n{result.stderr}")
+    # The measurements are the last line of output
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def get_git_commit():
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+def check_regressions(results, baseline_path, tolerance):
+    """Compare fps and count error against a previous results file"""
+    with open(baseline_path, 'r') as f:
+        baseline = {(r['resolution'], r['config']): r for r in json.load(f)['results']}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['resolution'], result['config']))
+        if not previous:
+            continue
+        if result['fps'] < previous['fps'] * (1 - tolerance):
+            regressions.append(f"{result['resolution']} {result['config']}: fps {previous['fps']:.1f} -> {result['fps']:.1f}")
+        if result['count_error'] > previous['count_error']:
+            regressions.append(f"{result['resolution']} {result['config']}: count error {previous['count_error']} -> {result['count_error']}")
+    return regressions
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.run_one:
+        print(json.dumps(run_one(json.loads(args.run_one))))
+        sys.exit(0)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.split('x'))
+            video_path = os.path.join(tmp_dir, f"synthetic_{resolution}.mp4")
+            print(f"Generating {resolution} video ({args.seconds}s, {args.density} people/min)...")
+            ground_truth = generate_video(video_path, width, height, args.fps, args.seconds, args.density)
+
+            for config in args.configs:
+                spec = {
+                    'video': video_path,
+                    'output': os.path.join(tmp_dir, f"{resolution}_{config}.mp4"),
+                    'csv_output': os.path.join(tmp_dir, f"{resolution}_{config}.csv"),
+                    'config': config,
+                    'model': args.model,
+                    'ground_truth': ground_truth,
+                }
+                measurements = run_config(spec)
+                results.append({'resolution': resolution, 'config': config, 'ground_truth': ground_truth, **measurements})
+                print(f"  {config:<16} {measurements['fps']:>7.1f} fps  p95 {measurements['latency_p95_ms'] or 0:>7.1f} ms  "
+                      f"rss {measurements['peak_rss_mb']:>7.0f} MB  count error {measurements['count_error']}")
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'commit': get_git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'params': {'seconds': args.seconds, 'fps': args.fps, 'density': args.density},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        regressions = check_regressions(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,25 @@
+import os
+import json
+
+# Exit code of counter.py when it stopped before the end of a video, the run can be resumed
+INTERRUPTED_EXIT_CODE = 130
+
+def save_checkpoint(checkpoint_path, state):
+    """Write a checkpoint atomically, a crash mid-write leaves the previous one intact"""
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp_path, checkpoint_path)
+
+def get_output_parts(checkpoint_path):
+    """File names of the output video parts of a resumed run, in order, or None for a single file"""
+    checkpoint = load_checkpoint(checkpoint_path)
+    parts = checkpoint.get('output_parts') if checkpoint else None
+    return parts if parts and len(parts) > 1 else None
+
+def load_checkpoint(checkpoint_path):
+    """Read a checkpoint, or None if there is none"""
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,139 @@
+import os
+import json
+from collections import deque
+
+import cv2
+
+class ClipRecorder:
+    """Writes short annotated clips around crossing events instead of the full video
+
+    The last pre_seconds of frames are kept in a rolling buffer together with
+    the counts and track trails at that moment. Frames are only drawn and
+    encoded when they become part of a clip, which starts with the buffered
+    frames on a crossing and ends post_seconds after the last crossing in it.
+    Every clip is listed with its crossing events in index.json. Without an
+    annotator the frames are written as given, for callers that already drew them.
+
+    An uncertain crossing is only known when the track expires, long after
+    the person left. With include_uncertain a clip is therefore started when
+    an uncounted track changes sides, and kept open until the track is either
+    counted or expires. A clip that ends up without events is deleted.
+
+    On resume the index of the previous run is kept, limited to the first
+    keep_clips clips when given (those finished at the checkpoint).
+    """
+    def __init__(self, clips_dir, fps, frame_size, annotator, pre_seconds=2.0, post_seconds=2.0,
+                 include_uncertain=False, get_timestamp=None, resume=False, keep_clips=None):
+        self.clips_dir = clips_dir
+        self.fps = fps
+        self.frame_size = frame_size
+        self.annotator = annotator
+        self.post_frames = max(int(post_seconds * fps), 1)
+        self.include_uncertain = include_uncertain
+        self.get_timestamp = get_timestamp
+        self.index_path = os.path.join(clips_dir, "index.json")
+
+        os.makedirs(clips_dir, exist_ok=True)
+        self.buffer = deque(maxlen=max(int(pre_seconds * fps), 1))
+        self.writer = None
+        self.clip = None
+        self.post_remaining = 0
+        self.index = []
+        # Frame where each pending track (changed sides, not counted yet) changed sides
+        self.pending = {}
+        if resume and os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)['clips']
+            if keep_clips is not None:
+                # Clips finished after the checkpoint are recorded again
+                for clip in self.index[keep_clips:]:
+                    path = os.path.join(clips_dir, clip['clip'])
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.index = self.index[:keep_clips]
+                self._write_index()
+
+    def add_frame(self, frame, frame_count, counts, track_ids, track_history, crossings):
+        """Buffer or write a processed frame, starting or extending a clip on crossings"""
+        # Only the trail points that get drawn are kept, the frame itself is not copied
+        trails = {track_id: list(track_history[track_id][-10:]) for track_id in track_ids}
+        snapshot = (frame, frame_count, counts.copy(), list(track_ids), trails)
+
+        events = []
+        changed = False
+        for track_id, direction in crossings:
+            if direction == 'changed':
+                if self.include_uncertain:
+                    self.pending[track_id] = frame_count
+                    changed = True
+                continue
+            changed_frame = self.pending.pop(track_id, None)
+            if direction != 'uncertain' or self.include_uncertain:
+                events.append((track_id, direction, changed_frame))
+
+        if events or changed:
+            if self.writer is None:
+                self._start_clip(frame_count)
+            for track_id, direction, changed_frame in events:
+                event = {
+                    'frame': frame_count,
+                    'timestamp': self.get_timestamp(frame_count) if self.get_timestamp else None,
+                    'track_id': int(track_id),
+                    'direction': direction,
+                }
+                if direction == 'uncertain' and changed_frame is not None:
+                    event['changed_frame'] = changed_frame
+                self.clip['events'].append(event)
+            self.post_remaining = self.post_frames
+
+        if self.writer is None:
+            self.buffer.append(snapshot)
+            return
+
+        self._write(snapshot)
+        self.post_remaining -= 1
+        if self.post_remaining <= 0 and not self.pending:
+            self._finish_clip()
+
+    def _start_clip(self, frame_count):
+        start_frame = self.buffer[0][1] if self.buffer else frame_count
+        clip_name = f"clip_{start_frame:08d}.mp4"
+        self.writer = cv2.VideoWriter(os.path.join(self.clips_dir, clip_name),
+                                      cv2.VideoWriter_fourcc(*'mp4v'), self.fps, self.frame_size)
+        self.clip = {'clip': clip_name, 'start_frame': start_frame, 'end_frame': None,
+                     'start_seconds': round(start_frame / self.fps, 3), 'events': []}
+
+        # Pre-event frames
+        while self.buffer:
+            self._write(self.buffer.popleft())
+
+    def _write(self, snapshot):
+        frame, frame_count, counts, track_ids, trails = snapshot
+        if self.annotator:
+            self.annotator.draw(frame, frame_count, counts, track_ids, trails)
+        self.writer.write(frame)
+        self.clip['end_frame'] = frame_count
+
+    def _finish_clip(self):
+        self.writer.release()
+        self.writer = None
+        clip, self.clip = self.clip, None
+        if not clip['events']:
+            # Only pending tracks, none of them counted or expired before the end
+            os.remove(os.path.join(self.clips_dir, clip['clip']))
+            return
+        clip['end_seconds'] = round(clip['end_frame'] / self.fps, 3)
+        self.index.append(clip)
+        # Rewritten after every clip so the index survives an interrupted run
+        self._write_index()
+
+    def _write_index(self):
+        with open(self.index_path, 'w') as f:
+            json.dump({'fps': self.fps, 'clips': self.index}, f, indent=2)
+
+    def close(self):
+        """Finish the clip in progress and write the index"""
+        if self.writer is not None:
+            self._finish_clip()
+        if not os.path.exists(self.index_path):
+            self._write_index()
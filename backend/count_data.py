@@ -0,0 +1,157 @@
+import os
+import json
+import gzip
+import threading
+from collections import OrderedDict
+
+from csv_tail import read_tail
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Count CSV columns sent as numbers in the columnar format
+INT_COLUMNS = {'total_present_inside', 'incoming_last_interval', 'outgoing_last_interval'}
+
+# Parsed count CSVs kept in memory
+MAX_CACHED_FILES = 64
+
+class CountData:
+    """A count CSV parsed into typed columns, with its encoded responses cached
+
+    The CSV only grows while a job runs, so a refresh parses just the lines
+    appended since the last one. Encoded and compressed responses are kept
+    until the file changes, so repeated polls cost a stat and a dict lookup.
+    """
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self._reset()
+        self.lock = threading.Lock()
+
+    def _reset(self):
+        self.header = []
+        self.columns = {}
+        self.offset = 0
+        self.last_line = None
+        self.version = None
+        self.encoded = {}
+
+    def refresh(self):
+        """Parse the lines appended since the last refresh"""
+        stat = os.stat(self.csv_path)
+        version = (stat.st_size, stat.st_mtime_ns)
+        if version == self.version:
+            return
+
+        lines, offset, last_line, reset = read_tail(self.csv_path, self.offset, self.last_line)
+        if reset:
+            # Rewritten by a resumed run
+            self._reset()
+        self.offset, self.last_line = offset, last_line
+        self.version = version
+        self.encoded = {}
+
+        if not self.header and lines:
+            self.header = lines.pop(0).split(',')
+            self.columns = {name: [] for name in self.header}
+        for line in lines:
+            # Count CSVs hold timestamps and integers only, no quoted fields
+            values = line.split(',')
+            if len(values) != len(self.header):
+                continue
+            try:
+                row = [int(value) if name in INT_COLUMNS else value for name, value in zip(self.header, values)]
+            except ValueError:
+                continue
+            for name, value in zip(self.header, row):
+                self.columns[name].append(value)
+
+    def etag(self, shape, media_type):
+        """Changes whenever the file does, weak since it covers every content encoding"""
+        return f'W/"{self.version[0]}-{self.version[1]}-{shape}-{media_type.split("/")[-1]}"'
+
+    def to_rows(self):
+        """Default shape: one dict per row with string values, as csv.DictReader returns them"""
+        columns = [[str(value) for value in self.columns[name]] for name in self.header]
+        return {"data": [dict(zip(self.header, values)) for values in zip(*columns)]}
+
+    def to_columns(self):
+        """Columnar shape: the column names once and a typed array per column"""
+        length = len(self.columns[self.header[0]]) if self.header else 0
+        return {"columns": self.header, "length": length, "data": self.columns}
+
+    def encode(self, shape, media_type, encoding):
+        """Response body for a shape, media type and content encoding, cached until the file changes"""
+        key = (shape, media_type, encoding)
+        if key not in self.encoded:
+            if encoding == "br":
+                body = brotli.compress(self.encode(shape, media_type, None), quality=5)
+            elif encoding == "gzip":
+                body = gzip.compress(self.encode(shape, media_type, None), compresslevel=6)
+            else:
+                payload = self.to_columns() if shape == "columns" else self.to_rows()
+                if media_type == "application/msgpack":
+                    body = msgpack.packb(payload)
+                else:
+                    body = json.dumps(payload, separators=(',', ':')).encode()
+            self.encoded[key] = body
+        return self.encoded[key]
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def get_count_data(csv_path):
+    """Cached CountData of a count CSV, refreshed to the file's current content"""
+    with _cache_lock:
+        count_data = _cache.pop(csv_path, None) or CountData(csv_path)
+        _cache[csv_path] = count_data
+        while len(_cache) > MAX_CACHED_FILES:
+            _cache.popitem(last=False)
+    with count_data.lock:
+        count_data.refresh()
+    return count_data
+
+def parse_qualities(header):
+    """{value: q} of an Accept or Accept-Encoding header, q defaults to 1"""
+    qualities = {}
+    for part in header.split(','):
+        value, *params = part.split(';')
+        value = value.strip().lower()
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        qualities[value] = quality
+    return qualities
+
+def negotiate_media_type(accept):
+    """msgpack when the client accepts it at least as much as JSON and it is installed, otherwise JSON"""
+    qualities = parse_qualities(accept)
+    if msgpack is not None:
+        msgpack_quality = max(qualities.get("application/msgpack", 0), qualities.get("application/x-msgpack", 0))
+        json_quality = qualities.get("application/json", qualities.get("application/*", qualities.get("*/*", 0)))
+        # q=0 refuses a type
+        if msgpack_quality > 0 and msgpack_quality >= json_quality:
+            return "application/msgpack"
+    return "application/json"
+
+def negotiate_encoding(accept_encoding, size):
+    """Content encoding the client prefers, brotli on a tie, none for small bodies"""
+    if size < 1000:
+        return None
+    qualities = parse_qualities(accept_encoding)
+    candidates = [name for name in ("br", "gzip") if name != "br" or brotli is not None]
+    best = max(candidates, key=lambda name: qualities.get(name, qualities.get("*", 0)))
+    return best if qualities.get(best, qualities.get("*", 0)) > 0 else None
@@ -7,21 +7,27 @@ Version: 1.0
 """
 
 import os
+import sys
+import time
+import signal
 import argparse
 import logging
-from tqdm import tqdm
-import cv2
 from typing import Literal
-import numpy as np
 from collections import defaultdict
-from ultralytics import YOLO
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 from csv_logger import CSVLogger
+from tracer import create_tracer, percentile
+from checkpoint import save_checkpoint, load_checkpoint, INTERRUPTED_EXIT_CODE
+from sampler import create_sampler
+from metrics import create_metrics
 
 load_dotenv()
 
+# ultralytics (torch), OpenCV, numpy and tqdm are imported where they are first
+# needed, so `--help` and argument errors return without loading the heavy stack
+
 # Directories
 current_dir = os.getcwd()
 # Get the parent directory
@@ -47,26 +53,61 @@ class PositionConfig(BaseModel):
     door_direction: Literal["up", "down", "left", "right"]
     boundary_cords: int
 
-def parse_arguments():
+def parse_arguments(argv=None):
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description='Person tracking and counting system')
     parser.add_argument('video', type=str, help='Path to input video')
     parser.add_argument('door_dir', type=str, choices=["up", "down", "left", "right"], help='Direction of the Door')
     parser.add_argument('--output', type=str, default=False, help='Path to output video')
+    parser.add_argument('--segment_seconds', type=float, default=0, help='Write the output video as segments of this many seconds with a playlist (0 for a single file)')
     parser.add_argument('--csv_output', type=str, default=False, help='Path to output CSV file')
     parser.add_argument('--skip_frames', type=int, default=DEFAULT_SKIP_FRAMES, help='Number of frames to skip between processing')
+    parser.add_argument('--adaptive', action='store_true', default=False, help='Adapt the frames skipped to activity near the line')
+    parser.add_argument('--max_stride', type=int, default=4, help='Adaptive sampling: process at least every this many frames')
+    parser.add_argument('--cpu_budget', type=float, default=None, help='Adaptive sampling: processing time as a fraction of video time to stay within, e.g. 1.0 for real time')
     parser.add_argument('--conf', type=float, default=DEFAULT_CONFIDENCE, help='Confidence threshold')
     parser.add_argument('--crop', action='store_true', default=False, help='Crop video while processing')
     parser.add_argument('--show', action='store_true', default=False, help='Show video while processing')
+    parser.add_argument('--preview', type=str, default=None, help='Path to publish the latest annotated frame as JPEG while it is watched')
+    parser.add_argument('--preview_fps', type=float, default=5.0, help='Maximum preview frame rate')
+    parser.add_argument('--preview_width', type=int, default=640, help='Width the preview frames are downscaled to')
+    parser.add_argument('--count_only', action='store_true', default=False, help='Only count: no drawing, output video or preview')
+    parser.add_argument('--clips_dir', type=str, default=None, help='Directory to save short annotated clips around crossings instead of the full video')
+    parser.add_argument('--clip_pre', type=float, default=2.0, help='Seconds of video kept before a crossing in a clip')
+    parser.add_argument('--clip_post', type=float, default=2.0, help='Seconds of video kept after a crossing in a clip')
+    parser.add_argument('--clip_uncertain', action='store_true', default=False, help='Also save clips around tracks that changed sides without being counted')
+    parser.add_argument('--tracks_output', type=str, default=None, help='Path to record tracks for rendering the video later with annotate.py')
     parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL, help='Interval in seconds for logging counts')
     parser.add_argument('--model', type=str, default=f"{MODEL_DIR}/{DEFAULT_MODEL}", help='Path to YOLO model')
-    return parser.parse_args()
+    parser.add_argument('--tracker', type=str, default=CUSTOM_TRACKER, help='Tracker configuration (e.g. custom_tracker.yaml, bytetrack.yaml, botsort.yaml)')
+    parser.add_argument('--metrics_file', type=str, default=None, help='Path to write pipeline metrics snapshots to, for the server\'s /metrics endpoint')
+    parser.add_argument('--metrics_interval', type=float, default=5.0, help='Seconds between metrics snapshots')
+    parser.add_argument('--stream', action='store_true', default=False, help='Treat the video as a live stream (RTSP/HTTP URL, device index or pipe)')
+    parser.add_argument('--realtime', action='store_true', default=False, help='Replay a video file at real-time speed as a live stream')
+    parser.add_argument('--max_latency', type=float, default=1.0, help='Stream mode: drop frames older than this many seconds')
+    parser.add_argument('--reconnect_attempts', type=int, default=-1, help='Stream mode: reconnect attempts per outage before giving up (-1 for unlimited)')
+    parser.add_argument('--checkpoint', type=str, default=None, help='Path to periodically save progress for resuming')
+    parser.add_argument('--checkpoint_interval', type=float, default=5.0, help='Seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true', default=False, help='Resume from the checkpoint if one exists')
+    parser.add_argument('--stats', action='store_true', default=False, help='Print per-stage timing percentiles at the end')
+    parser.add_argument('--trace', type=str, default=None, help='Path to save a Chrome/Perfetto trace of per-stage timings')
+    parser.add_argument('--profile', type=str, default=None, help='Path to save a cProfile of sampled frames')
+    parser.add_argument('--profile_every', type=int, default=100, help='Profile one frame out of this many')
+    return parser.parse_args(argv)
 
 class PersonTracker:
-    def __init__(self, model_path, confidence=0.2):
-        """Initialize the person tracker with a YOLO model"""
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, confidence=0.2, tracker_config=CUSTOM_TRACKER):
+        """Initialize the person tracker with a YOLO model
+        
+        Without a model_path only the counting state is kept, for callers that
+        run detection and tracking themselves and pass results to update_counts.
+        """
+        self.model = None
+        if model_path:
+            from ultralytics import YOLO
+            self.model = YOLO(model_path)
         self.confidence = confidence
+        self.tracker_config = tracker_config
         self.track_history = defaultdict(lambda: [])
         self.crossing_records = defaultdict(lambda: {'first_position': None, 'last_position': None, 'counted': False})
         self.counts = {'total': 0, 'incoming': 0, 'outgoing': 0}
@@ -76,6 +117,34 @@ class PersonTracker:
         self.max_disappeared = 90
         self.disappeared_tracks = defaultdict(int)
         
+        # Added to tracker IDs, so IDs restarted by a resumed run do not collide with restored tracks
+        self.track_id_offset = 0
+        
+        # Lost-track buffer of the ultralytics tracker, in tracker updates at a stride of 1
+        self.base_max_time_lost = None
+    
+    def get_state(self):
+        """Counts, crossing records and recent track history, for checkpointing"""
+        return {
+            'counts': self.counts.copy(),
+            'track_history': {int(track_id): [[int(x), int(y)] for x, y in history[-10:]]
+                              for track_id, history in self.track_history.items()},
+            'crossing_records': {int(track_id): dict(record) for track_id, record in self.crossing_records.items()},
+            'disappeared_tracks': {int(track_id): count for track_id, count in self.disappeared_tracks.items()},
+            'max_track_id': max([int(track_id) for track_id in self.track_history] + [self.track_id_offset]),
+        }
+    
+    def load_state(self, state):
+        """Restore a checkpointed state"""
+        self.counts = state['counts'].copy()
+        for track_id, history in state['track_history'].items():
+            self.track_history[int(track_id)] = [tuple(point) for point in history]
+        for track_id, record in state['crossing_records'].items():
+            self.crossing_records[int(track_id)].update(record)
+        for track_id, count in state['disappeared_tracks'].items():
+            self.disappeared_tracks[int(track_id)] = count
+        self.track_id_offset = state['max_track_id'] + 1
+        
     def reset_track(self, track_id):
         """Reset a track if it disappears for too long"""
         if track_id in self.track_history:
@@ -85,83 +154,128 @@ class PersonTracker:
         if track_id in self.disappeared_tracks:
             del self.disappeared_tracks[track_id]
     
-    def update_disappeared_tracks(self, active_track_ids):
-        """Update and manage disappeared tracks"""
+    def set_frame_stride(self, stride):
+        """Keep the tracker's lost-track buffer constant in video time when only every stride-th frame is tracked"""
+        predictor = getattr(self.model, 'predictor', None)
+        for tracker in getattr(predictor, 'trackers', None) or []:
+            if self.base_max_time_lost is None:
+                self.base_max_time_lost = tracker.max_time_lost
+            tracker.max_time_lost = max(int(self.base_max_time_lost / stride), 1)
+    
+    def update_disappeared_tracks(self, active_track_ids, elapsed=1):
+        """Update and manage disappeared tracks, elapsed is the number of frames since the last update
+        
+        Returns the IDs of expired tracks that changed sides without being counted.
+        """
         all_tracks = set(self.track_history.keys())
+        uncertain = []
         
         for track_id in all_tracks:
             if track_id not in active_track_ids:
-                self.disappeared_tracks[track_id] += 1
+                self.disappeared_tracks[track_id] += elapsed
                 
                 if self.disappeared_tracks[track_id] > self.max_disappeared:
+                    record = self.crossing_records.get(track_id)
+                    if record and not record['counted'] and record.get('changed'):
+                        uncertain.append(track_id)
                     self.reset_track(track_id)
             else:
                 self.disappeared_tracks[track_id] = 0
+        return uncertain
 
-    def process_frame(self, frame, position):
-        """Process a single frame for person tracking and counting"""
-        results = self.model.track(frame, persist=True, classes=0, tracker=CUSTOM_TRACKER)
+    def track(self, frame):
+        """Run detection and tracking, returning person boxes and track IDs"""
+        results = self.model.track(frame, persist=True, classes=0, tracker=self.tracker_config)
         #   half=True, device="mps")
         
+        if results[0].boxes.id is None:
+            return [], []
+        
+        boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
+        track_ids = results[0].boxes.id.cpu().numpy().astype(int) + self.track_id_offset
+        return boxes, track_ids
+    
+    def update_counts(self, boxes, track_ids, position, elapsed=1):
+        """Update track histories and count tracks crossing the boundary
+        
+        elapsed is the number of video frames since the previous update, so
+        disappeared tracks expire after the same video time at any stride.
+        Returns the crossings of this frame as (track_id, direction) pairs, where
+        direction is 'incoming', 'outgoing', 'changed' when an uncounted track
+        first changes sides (it may still be counted) or 'uncertain' when such
+        a track expires without being counted.
+        """
         active_track_ids = []
+        crossings = []
         
-        if results[0].boxes.id is not None:
-            boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-            track_ids = results[0].boxes.id.cpu().numpy().astype(int)
+        for box, track_id in zip(boxes, track_ids):
+            active_track_ids.append(track_id)
+            x1, y1, x2, y2 = box
             
-            for box, track_id in zip(boxes, track_ids):
-                active_track_ids.append(track_id)
-                x1, y1, x2, y2 = box
-                
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-                
-                self.track_history[track_id].append((center_x, center_y))
-                
-                if len(self.track_history[track_id]) > self.max_disappeared:
-                    self.track_history[track_id].pop(0)
-                
-                # Determine current position
-                if position.line_orientation == "horizontal":
-                    if position.door_direction == "down":
-                        current_position = 'outside' if center_y < position.boundary_cords else 'inside'
-                    elif position.door_direction == "up":
-                        current_position = 'outside' if center_y > position.boundary_cords else 'inside'
-                elif position.line_orientation == "vertical":
-                    if position.door_direction == "right":
-                        current_position = 'outside' if center_x < position.boundary_cords else 'inside'
-                    elif position.door_direction == "left":
-                        current_position = 'outside' if center_x > position.boundary_cords else 'inside'
-                
-                if track_id not in self.crossing_records or self.crossing_records[track_id]['first_position'] is None:
-                    self.crossing_records[track_id]['first_position'] = current_position
-                
-                self.crossing_records[track_id]['last_position'] = current_position
-                
-                # Check for crossing
-                if (self.crossing_records[track_id]['counted'] is False and 
-                    self.crossing_records[track_id]['first_position'] != current_position and
-                    len(self.track_history[track_id]) >= self.min_track_length):
-                    
-                    if self._verify_crossing(track_id, position, 1):
-                        if self.crossing_records[track_id]['first_position'] == 'outside' and current_position == 'inside':
-                            self.counts['incoming'] += 1
-                            self.counts['total'] += 1
-                        elif self.crossing_records[track_id]['first_position'] == 'inside' and current_position == 'outside':
-                            self.counts['outgoing'] += 1
-                            self.counts['total'] -= 1
-                        self.crossing_records[track_id]['counted'] = True
-
-                # Draw visualizations
-                cv2.circle(frame, (center_x, center_y), 5, (0, 255, 0), -1)
-                cv2.putText(frame, f"{track_id}", (center_x - 20, center_y - 0), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            center_x = (x1 + x2) // 2
+            center_y = (y1 + y2) // 2
+            
+            self.track_history[track_id].append((center_x, center_y))
+            
+            if len(self.track_history[track_id]) > self.max_disappeared:
+                self.track_history[track_id].pop(0)
+            
+            # Determine current position
+            if position.line_orientation == "horizontal":
+                if position.door_direction == "down":
+                    current_position = 'outside' if center_y < position.boundary_cords else 'inside'
+                elif position.door_direction == "up":
+                    current_position = 'outside' if center_y > position.boundary_cords else 'inside'
+            elif position.line_orientation == "vertical":
+                if position.door_direction == "right":
+                    current_position = 'outside' if center_x < position.boundary_cords else 'inside'
+                elif position.door_direction == "left":
+                    current_position = 'outside' if center_x > position.boundary_cords else 'inside'
+            
+            if track_id not in self.crossing_records or self.crossing_records[track_id]['first_position'] is None:
+                self.crossing_records[track_id]['first_position'] = current_position
+            
+            self.crossing_records[track_id]['last_position'] = current_position
+            
+            # Check for crossing
+            if (self.crossing_records[track_id]['counted'] is False and 
+                self.crossing_records[track_id]['first_position'] != current_position and
+                len(self.track_history[track_id]) >= self.min_track_length):
                 
-                points = np.hstack(self.track_history[track_id][-10:]).astype(np.int32).reshape((-1, 1, 2))
-                cv2.polylines(frame, [points], isClosed=False, color=(0, 255, 0), thickness=2)
+                if self._verify_crossing(track_id, position, 1):
+                    if self.crossing_records[track_id]['first_position'] == 'outside' and current_position == 'inside':
+                        self.counts['incoming'] += 1
+                        self.counts['total'] += 1
+                        crossings.append((track_id, 'incoming'))
+                    elif self.crossing_records[track_id]['first_position'] == 'inside' and current_position == 'outside':
+                        self.counts['outgoing'] += 1
+                        self.counts['total'] -= 1
+                        crossings.append((track_id, 'outgoing'))
+                    self.crossing_records[track_id]['counted'] = True
+            
+            # Marks where a possible uncertain crossing starts, once per track
+            if (self.crossing_records[track_id]['counted'] is False and
+                self.crossing_records[track_id]['first_position'] != current_position and
+                not self.crossing_records[track_id].get('changed')):
+                self.crossing_records[track_id]['changed'] = True
+                crossings.append((track_id, 'changed'))
         
-        self.update_disappeared_tracks(active_track_ids)
+        for track_id in self.update_disappeared_tracks(active_track_ids, elapsed):
+            crossings.append((track_id, 'uncertain'))
+        
+        return crossings
+    
+    def draw_tracks(self, frame, track_ids):
+        """Draw the center, ID and recent trail of each active track"""
+        from annotator import draw_tracks
         
-        return frame
+        return draw_tracks(frame, track_ids, self.track_history)
+    
+    def process_frame(self, frame, position):
+        """Process a single frame for person tracking and counting"""
+        boxes, track_ids = self.track(frame)
+        self.update_counts(boxes, track_ids, position)
+        return self.draw_tracks(frame, track_ids)
     
     def _verify_crossing(self, track_id, position, min_required=1):
         """Verify that a crossing is legitimate by checking the trajectory"""
@@ -183,35 +297,61 @@ class PersonTracker:
                
         return positions_outside >= min_required and positions_inside >= min_required
 
+def get_crop(frame_width, frame_height):
+    """Center crop box (top, bottom, left, right) keeping half of each dimension"""
+    return int(frame_height * 0.25), int(frame_height * 0.75), int(frame_width * 0.25), int(frame_width * 0.75)
+
+def get_position(door_dir, frame_width, frame_height):
+    """Configure a boundary line through the middle of the frame for a door direction"""
+    if door_dir in ["up", "down"]:
+        return PositionConfig(line_orientation="horizontal", door_direction=door_dir, boundary_cords=frame_height // 2)
+    elif door_dir in ["left", "right"]:
+        return PositionConfig(line_orientation="vertical", door_direction=door_dir, boundary_cords=frame_width // 2)
+
+def get_run_settings(args):
+    """Arguments a checkpoint is only valid for, stored in it and compared on resume"""
+    return {'video': args.video, 'door_dir': args.door_dir, 'crop': args.crop}
+
 def process_video(args):
     """Process video with person tracking and counting"""
-    cap = cv2.VideoCapture(args.video)
+    import cv2
+    from tqdm import tqdm
+    from video_source import open_source
+    
+    source = open_source(args)
 
-    if not cap.isOpened():
+    if not source.is_opened():
         print(f"Error: Could not open video {args.video}")
         return
     
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    checkpoint = load_checkpoint(args.checkpoint) if args.resume else None
+    settings = get_run_settings(args)
+    mismatched = [key for key, value in settings.items() if checkpoint and checkpoint.get(key, value) != value]
+    if mismatched:
+        # Counts, boundary and frame positions of the checkpoint do not apply to this run
+        print(f"Checkpoint was saved with a different {', '.join(mismatched)}, starting over")
+        checkpoint = None
+    if checkpoint and checkpoint['completed']:
+        source.release()
+        print(f"Counting already completed. Results: {checkpoint['tracker']['counts']}")
+        return {'counts': checkpoint['tracker']['counts'], 'frames': checkpoint['frame_count'], 'timings': {},
+                'latencies': [], 'dropped_frames': 0, 'completed': True}
+    if checkpoint:
+        print(f"Resuming from frame {checkpoint['frame_count']}")
+        source.seek(checkpoint['frame_count'])
+    
+    frame_width = source.width
+    frame_height = source.height
+    fps = source.fps
+    total_frames = source.total_frames
 
     if args.crop:
-        crop_top = int(frame_height * 0.25)
-        crop_bottom = int(frame_height * 0.75)
-        crop_left = int(frame_width * 0.25)
-        crop_right = int(frame_width * 0.75)
+        crop_top, crop_bottom, crop_left, crop_right = get_crop(frame_width, frame_height)
         frame_width = frame_width // 2
         frame_height = frame_height // 2
 
-    mid_height = frame_height // 2
-    mid_width = frame_width // 2
-
     # Configure position
-    if args.door_dir in ["up", "down"]:
-        position = PositionConfig(line_orientation="horizontal", door_direction=args.door_dir, boundary_cords=frame_height // 2)
-    elif args.door_dir in ["left", "right"]:
-        position = PositionConfig(line_orientation="vertical", door_direction=args.door_dir, boundary_cords=frame_width // 2)
+    position = get_position(args.door_dir, frame_width, frame_height)
     
     # Initialize CSV logger
     csv_logger = None
@@ -221,96 +361,242 @@ def process_video(args):
         csv_filename = os.path.basename(args.video).split(".")[0] + ".csv"
         csv_filepath = os.path.join(OUTPUT_DIR, csv_filename)
         
-    csv_logger = CSVLogger(csv_filepath, fps, args.interval)
+    csv_logger = CSVLogger(csv_filepath, fps, args.interval, checkpoint['csv_logger'] if checkpoint else None)
     
-    # Set output video path
-    if args.output:
-        output_filepath = args.output
-        output_dir = os.path.dirname(output_filepath)
-    else:
-        output_dir = OUTPUT_DIR
-        output_filename = os.path.basename(args.video)
-        output_filepath = os.path.join(output_dir, output_filename)
+    # Frames are only drawn and encoded when something consumes them
+    write_output = bool(args.output) and not args.count_only
+    show = args.show and not args.count_only
     
-    os.makedirs(output_dir, exist_ok=True)
-
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_filepath, fourcc, fps, (frame_width, frame_height))
-
-    tracker = PersonTracker(args.model, args.conf)
+    out = None
+    output_parts = []
+    if write_output and args.segment_seconds > 0:
+        from segment_writer import SegmentWriter
+        segments_dir = os.path.splitext(args.output)[0] + "_segments"
+        out = SegmentWriter(segments_dir, fps, (frame_width, frame_height), args.segment_seconds,
+                           resume=checkpoint is not None, keep_segments=checkpoint.get('segments') if checkpoint else None)
+    elif write_output:
+        if checkpoint:
+            # An MP4 cannot be appended to, the resumed part goes to its own file
+            output_parts = checkpoint.get('output_parts', [os.path.basename(args.output)])
+            root, ext = os.path.splitext(args.output)
+            args.output = f"{root}_from{checkpoint['frame_count']}{ext}"
+        if os.path.basename(args.output) not in output_parts:
+            output_parts.append(os.path.basename(args.output))
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(args.output, fourcc, fps, (frame_width, frame_height))
+    
+    annotator = None
+    if write_output or show:
+        from annotator import Annotator
+        annotator = Annotator(frame_width, frame_height, position, total_frames)
     
-    frame_count = 0
-    pbar = tqdm(total=total_frames, desc="Processing frames")
+    # The preview only draws frames while someone watches, so it is also kept in count-only mode
+    preview = None
+    preview_annotator = None
+    if args.preview:
+        from annotator import Annotator
+        from preview import PreviewWriter
+        preview = PreviewWriter(args.preview, args.preview_fps, args.preview_width)
+        preview_annotator = Annotator(frame_width, frame_height, position, total_frames)
     
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            break
+    clip_recorder = None
+    if args.clips_dir and not args.count_only:
+        from annotator import Annotator
+        from clip_recorder import ClipRecorder
+        # Frames already drawn for the output video or window are not drawn again
+        clip_recorder = ClipRecorder(args.clips_dir, fps, (frame_width, frame_height),
+                                     None if annotator else Annotator(frame_width, frame_height, position, total_frames),
+                                     args.clip_pre, args.clip_post, args.clip_uncertain, csv_logger.get_timestamp,
+                                     resume=checkpoint is not None,
+                                     keep_clips=checkpoint.get('clips') if checkpoint else None)
+    
+    recorder = None
+    if args.tracks_output:
+        from track_recorder import TrackRecorder
+        recorder = TrackRecorder(args.tracks_output, checkpoint.get('tracks_recorder') if checkpoint else None)
 
-        if args.crop:
-            frame = frame[crop_top:crop_bottom, crop_left:crop_right]
+    tracker = PersonTracker(args.model, args.conf, args.tracker)
+    if checkpoint:
+        tracker.load_state(checkpoint['tracker'])
+    metrics = create_metrics(args.metrics_file, args.metrics_interval)
+    tracer = metrics.wrap_tracer(create_tracer(args.trace, args.profile, args.profile_every, args.stats))
+    
+    frame_count = checkpoint['frame_count'] if checkpoint else 0
+    stale_frames = 0
+    latencies = []
+    completed = False
+    pbar = tqdm(total=total_frames, initial=frame_count, desc="Processing frames")
+    
+    def write_checkpoint():
+        state = {
+            **settings,
+            'frame_count': frame_count,
+            'completed': completed,
+            'tracker': tracker.get_state(),
+            'csv_logger': csv_logger.get_state(),
+        }
+        if recorder:
+            state['tracks_recorder'] = recorder.get_state()
+        if output_parts:
+            state['output_parts'] = output_parts
+        if write_output and args.segment_seconds > 0:
+            state['segments'] = len(out.segments)
+        if clip_recorder:
+            state['clips'] = len(clip_recorder.index)
+        save_checkpoint(args.checkpoint, state)
+    
+    last_checkpoint = time.monotonic()
+    
+    sampler = create_sampler(args, position, frame_width, frame_height, fps)
+    stride = 1
+    last_processed = frame_count
+    
+    try:
+        while True:
+            tracer.begin_frame(frame_count + 1)
+            frame_start = time.perf_counter()
+            if stride > 1:
+                # Frames between processed ones are only grabbed, not decoded
+                skipped = source.skip(stride - 1)
+                pbar.update(skipped)
+                metrics.skipped(skipped)
+            frame_data = source.read()
+            if frame_data is None:
+                completed = True
+                break
+            
+            # frame_count follows the source, so dropped stream frames keep CSV timestamps in step
+            frame, frame_count, capture_time = frame_data
 
-        frame_count += 1
-        pbar.update(1)
-        
-        if args.skip_frames != 0 and (frame_count - 1) % args.skip_frames != 0:
-            continue
-        
-        # Draw boundary line
-        if position.line_orientation == "horizontal":
-            cv2.line(frame, (0, mid_height), (frame_width, mid_height), (255, 0, 0), 2)
-            quater_height = frame_height // 4
-            if position.door_direction == "down":
-                cv2.putText(frame, "Outside", (mid_width, mid_height - quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                cv2.putText(frame, "Inside", (mid_width, mid_height + quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-            elif position.door_direction == "up":
-                cv2.putText(frame, "Outside", (mid_width, mid_height + quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                cv2.putText(frame, "Inside", (mid_width, mid_height - quater_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-        elif position.line_orientation == "vertical":
-            cv2.line(frame, (mid_width, 0), (mid_width, frame_height), (255, 0, 0), 2)
-            quater_width = frame_width // 4
-            if position.door_direction == "right":
-                cv2.putText(frame, "Outside", (mid_width - quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                cv2.putText(frame, "Inside", (mid_width + quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-            elif position.door_direction == "left":
-                cv2.putText(frame, "Outside", (mid_width + quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                cv2.putText(frame, "Inside", (mid_width - quater_width, mid_height), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            if args.crop:
+                frame = frame[crop_top:crop_bottom, crop_left:crop_right]
 
-        frame = tracker.process_frame(frame, position)
-        
-        # Log to CSV if needed
-        if csv_logger:
-            csv_logger.log_counts(frame_count, tracker.counts)
-        
-        count_text = f"Total: {tracker.counts['total']} | In: {tracker.counts['incoming']} | Out: {tracker.counts['outgoing']}"
-        cv2.putText(frame, count_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
-        
-        cv2.putText(frame, f"Frame: {frame_count}/{total_frames}", (10, frame_height - 20), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-        
-        if args.output:
-            out.write(frame)
+            pbar.update(1)
+            tracer.mark('decode')
+            metrics.update(source.dropped_frames + stale_frames)
+            
+            if source.is_stream:
+                # Skip frames that waited too long, the next capture is fresher
+                if time.monotonic() - capture_time > args.max_latency:
+                    stale_frames += 1
+                    tracer.end_frame()
+                    continue
+            
+            # Frames since the last processed one, varies with the sampler's stride and dropped stream frames
+            elapsed = frame_count - last_processed
+            last_processed = frame_count
+            
+            tracker.set_frame_stride(elapsed)
+            boxes, track_ids = tracker.track(frame)
+            tracer.mark('track')
+            
+            crossings = tracker.update_counts(boxes, track_ids, position, elapsed)
+            tracer.mark('crossing')
+            
+            # Log to CSV if needed
+            if csv_logger:
+                csv_logger.log_counts(frame_count, tracker.counts)
+            if recorder:
+                recorder.record(frame_count, tracker.counts, track_ids, tracker.track_history)
+            tracer.mark('csv')
+            
+            # Drawn after tracking only, so the detector sees the same frames whether or not they are annotated
+            if annotator:
+                annotator.draw(frame, frame_count, tracker.counts, track_ids, tracker.track_history)
+            tracer.mark('draw')
+            
+            if out:
+                out.write(frame)
+            if clip_recorder:
+                clip_recorder.add_frame(frame, frame_count, tracker.counts, track_ids, tracker.track_history, crossings)
+            tracer.mark('write')
+            
+            if preview and preview.wants_frame():
+                if annotator:
+                    preview.submit(frame)
+                else:
+                    preview.submit(preview_annotator.draw(frame.copy(), frame_count, tracker.counts,
+                                                          track_ids, tracker.track_history))
+            
+            if show:
+                cv2.imshow("People Counter", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            tracer.mark('show')
+            tracer.end_frame()
+            
+            if not source.is_stream:
+                stride = sampler.next_stride(track_ids, tracker.track_history, elapsed, time.perf_counter() - frame_start)
+            metrics.frame_processed(track_ids, crossings, stride)
+            
+            if args.checkpoint and time.monotonic() - last_checkpoint >= args.checkpoint_interval:
+                write_checkpoint()
+                last_checkpoint = time.monotonic()
+            
+            if source.is_stream:
+                # End-to-end latency from capture to counted and written
+                latencies.append(time.monotonic() - capture_time)
+                if len(latencies) % 30 == 0:
+                    pbar.set_postfix(latency=f"{latencies[-1] * 1000:.0f}ms", dropped=source.dropped_frames + stale_frames)
         
-        if args.show:
-            cv2.imshow("People Counter", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+    except KeyboardInterrupt:
+        # Live streams have no end, Ctrl+C stops counting and finalizes the outputs
+        print("Stopped by user")
     
     pbar.close()
+    tracer.close()
+    metrics.update(source.dropped_frames + stale_frames, force=True)
     
-    cap.release()
-    if args.output:
+    source.release()
+    if out:
         out.release()
-    if args.show:
+    if clip_recorder:
+        clip_recorder.close()
+    # After the video outputs are finalized, so their last segment and clip are kept on resume
+    if args.checkpoint:
+        write_checkpoint()
+    if recorder:
+        recorder.close()
+    if preview:
+        preview.close()
+    if show:
         cv2.destroyAllWindows()
     
-    print(f"Counting completed. Results: {tracker.counts}")
+    if completed or source.is_stream:
+        print(f"Counting completed. Results: {tracker.counts}")
+    else:
+        print(f"Counting stopped at frame {frame_count}. Results so far: {tracker.counts}")
+    if source.is_stream and latencies:
+        ordered = sorted(latencies)
+        print(f"Latency p50: {percentile(ordered, 50) * 1000:.0f} ms | p95: {percentile(ordered, 95) * 1000:.0f} ms | "
+              f"max: {ordered[-1] * 1000:.0f} ms | Frames dropped: {source.dropped_frames} superseded, {stale_frames} stale | Reconnects: {source.reconnects}")
     if args.csv_output:
         print(f"CSV data saved to {args.csv_output}")
-    if args.output:
+    if write_output and args.segment_seconds > 0:
+        print(f"Output video segments saved to {out.segments_dir}")
+    elif write_output:
         print(f"Output video saved to {args.output}")
+    if clip_recorder:
+        print(f"{len(clip_recorder.index)} clips saved to {args.clips_dir}")
+    if args.tracks_output:
+        print(f"Tracks saved to {args.tracks_output}, render the video with annotate.py")
+    
+    return {'counts': tracker.counts, 'frames': frame_count, 'timings': tracer.summary(),
+            'latencies': latencies, 'dropped_frames': source.dropped_frames + stale_frames,
+            'completed': completed or source.is_stream}
+
+def stop_on_sigterm(signum, frame):
+    """SIGTERM stops counting like Ctrl+C: final checkpoint, outputs finalized"""
+    raise KeyboardInterrupt
 
 if __name__ == "__main__":
     args = parse_arguments()
     # validate_arguments(args)
-    process_video(args)
\ No newline at end of file
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    result = process_video(args)
+    if result and not result['completed']:
+        # A video stopped before its end must not look finished to the server or a worker, they resume it
+        sys.exit(INTERRUPTED_EXIT_CODE)
\ No newline at end of file
@@ -1,9 +1,10 @@
 from datetime import datetime, timedelta
+import os
 import csv
 
 class CSVLogger:
     """Handles CSV logging of counting data at some intervals"""
-    def __init__(self, csv_path, fps, interval_seconds=60):
+    def __init__(self, csv_path, fps, interval_seconds=60, state=None):
         self.start_time = datetime.now()
         self.csv_path = csv_path
         self.fps = fps
@@ -11,11 +12,33 @@ class CSVLogger:
         self.interval_start_counts = {'total': 0, 'incoming': 0, 'outgoing': 0}
         self.interval_seconds = interval_seconds
         
+        if state:
+            # Resume: continue the existing file from the checkpointed state
+            self.load_state(state)
+            return
+        
         # Initialize CSV file with headers
         with open(csv_path, 'w', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(['timestamp', 'total_present_inside', 'incoming_last_interval', 'outgoing_last_interval'])
     
+    def get_state(self):
+        """Interval state and file size, for checkpointing"""
+        return {
+            'start_time': self.start_time.isoformat(),
+            'last_interval': self.last_interval,
+            'interval_start_counts': self.interval_start_counts.copy(),
+            'csv_size': os.path.getsize(self.csv_path),
+        }
+    
+    def load_state(self, state):
+        """Restore the interval state, dropping rows written after the checkpoint"""
+        self.start_time = datetime.fromisoformat(state['start_time'])
+        self.last_interval = state['last_interval']
+        self.interval_start_counts = state['interval_start_counts'].copy()
+        with open(self.csv_path, 'r+') as f:
+            f.truncate(state['csv_size'])
+    
     def get_timestamp(self, frame_count):
         """Convert frame count to timestamp in HH:MM:SS format"""
         seconds = int(frame_count / self.fps)
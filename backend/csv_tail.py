@@ -0,0 +1,46 @@
+import os
+
+def has_new_lines(csv_path, offset=0, last_line=None):
+    """Whether read_tail would return anything, without reading more than the last line"""
+    if os.path.getsize(csv_path) != offset:
+        return True
+    if not offset:
+        return False
+    if not last_line or offset < len(last_line):
+        return True
+    with open(csv_path, 'rb') as f:
+        f.seek(offset - len(last_line))
+        return f.read(len(last_line)) != last_line
+
+def read_tail(csv_path, offset=0, last_line=None):
+    """Complete lines appended to a growing CSV since the previous read
+
+    offset and last_line come from the previous call, last_line being the raw
+    bytes of the last line it returned. A resumed counter run truncates the CSV
+    to its checkpoint and appends from there, so the file may have grown past
+    offset again with different content. When the bytes before offset no longer
+    end with last_line the file was rewritten and is read from the start.
+
+    Returns (lines, offset, last_line, reset), reset telling the caller to drop
+    what it built from earlier reads.
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as f:
+        reset = False
+        if offset:
+            # Without a last line to compare, e.g. state from before it was kept, start over
+            start = offset - len(last_line or b"")
+            f.seek(max(start, 0))
+            if not last_line or size < offset or start < 0 or f.read(len(last_line)) != last_line:
+                reset = True
+                offset = 0
+        f.seek(offset)
+        data = f.read(size - offset)
+
+    # Only complete lines, the counter may be writing the next one
+    data = data[:data.rfind(b"\n") + 1]
+    if not data:
+        return [], offset, None if reset else last_line, reset
+
+    last_line = data[data.rfind(b"\n", 0, len(data) - 1) + 1:]
+    return data.decode().splitlines(), offset + len(data), last_line, reset
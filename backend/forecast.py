@@ -8,16 +8,13 @@ Version: 1.0
 
 import os
 import argparse
+import time
 import warnings
 from datetime import timedelta
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from dotenv import load_dotenv
-from sklearn.ensemble import RandomForestRegressor
 
-warnings.filterwarnings('ignore')
+# pandas, numpy, scikit-learn, matplotlib and seaborn are imported inside the
+# functions that use them, so `--help` and chart-less runs start quickly
 
 load_dotenv()
 
@@ -53,6 +50,8 @@ def is_working_hour(timestamp):
 
 def get_working_hours_only(df):
     """Filter to only working hours"""
+    import pandas as pd
+    
     df = df.copy()
     df['timestamp'] = pd.to_datetime(df['timestamp'])
     df['is_working'] = df['timestamp'].apply(is_working_hour)
@@ -104,8 +103,15 @@ def create_lag_features(df, target_col, lags=[1, 2, 3, 24, 48]):
     
     return df
 
-def create_timeseries_chart(result_df, output_path=None):
+def create_timeseries_chart(result_df, output_path=None, show=True, dpi=300):
     """Create a seaborn timeseries chart for the forecast results"""
+    import matplotlib
+    if not show:
+        # Render off-screen, no display or GUI toolkit needed
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     # Set up the plot style
     plt.style.use('default')
     sns.set_palette("husl")
@@ -147,11 +153,14 @@ def create_timeseries_chart(result_df, output_path=None):
     # Save the chart if output path is provided
     if output_path:
         chart_path = output_path.replace('.csv', '_chart.png')
-        plt.savefig(chart_path, dpi=300, bbox_inches='tight')
+        plt.savefig(chart_path, dpi=dpi, bbox_inches='tight')
         print(f"✓ Chart saved to: {chart_path}")
     
     # Show the plot
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
     
     return fig
 
@@ -160,6 +169,8 @@ def parse_arguments():
     parser.add_argument('csv', type=str, help='Path to the count CSV file')
     parser.add_argument('--output', type=str, default=None, help='Path to save the forecast CSV (optional)')
     parser.add_argument('--n_estimators', type=int, default=500, help='Number of trees in Random Forest')
+    parser.add_argument('--chart', type=str, default='show', choices=['show', 'save', 'none'], help='Show and save the chart, only save it (headless) or skip it')
+    parser.add_argument('--dpi', type=int, default=300, help='Resolution of the saved chart')
     return parser.parse_args()
 
 def get_output_path(input_csv, output_csv):
@@ -173,68 +184,124 @@ def get_output_path(input_csv, output_csv):
     output_filename = f'{base_name}_forecast.csv'
     return os.path.join(OUTPUT_DIR, output_filename)
 
-def forecast_random_forest(df_working, target_col, forecast_timestamps, n_estimators=100):
-    """Forecast using Random Forest Regressor"""
-    try:
-        # Create features for training data
-        df_train = create_features(df_working)
-        # df_train = create_lag_features(df_train, target_col)
-        
-        # Drop rows with NaN (from lag features)
-        df_train_clean = df_train.dropna()
-        
-        if len(df_train_clean) < 10:
-            print(f"    Not enough data after creating lag features")
-            return None
-        
-        # Define feature columns
-        feature_cols = ['day', 'hour', 'day_of_week', 'is_weekend',] # 'month', 'day_of_month', 'week_of_year']
-        
-        # Prepare training data
-        X_train = df_train_clean[feature_cols]
-        y_train = df_train_clean[target_col]
-        
-        # Train Random Forest
-        model = RandomForestRegressor(
+# Feature columns used by the regression models
+FEATURE_COLS = ['day', 'hour', 'day_of_week', 'is_weekend',] # 'month', 'day_of_month', 'week_of_year']
+LAGS = [1, 2, 3, 24, 48]
+
+def get_lag_feature_cols(target_col, lags=LAGS):
+    """Names of the columns added by create_lag_features"""
+    cols = [f'{target_col}_lag_{lag}' for lag in lags]
+    cols += [f'{target_col}_rolling_mean_3', f'{target_col}_rolling_mean_24', f'{target_col}_rolling_std_24']
+    return cols
+
+def make_regressor(name, n_estimators=100, n_jobs=-1):
+    """Create a regression model by name"""
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(
             n_estimators=n_estimators,
             max_depth=15,
             min_samples_split=5,
             min_samples_leaf=2,
             random_state=42,
-            n_jobs=-1
+            n_jobs=n_jobs
         )
-        
-        model.fit(X_train, y_train)
-        
-        # Prepare forecast data
-        forecast_df = pd.DataFrame({'timestamp': forecast_timestamps})
-        forecast_df = create_features(forecast_df)
-        
-        # Create a combined dataframe for lag feature generation
-        combined_df = pd.concat([
-            df_working[['timestamp', target_col]],
-            forecast_df[['timestamp']].assign(**{target_col: np.nan})
-        ], ignore_index=True)
-        
-        combined_df = create_features(combined_df)
-        # combined_df = create_lag_features(combined_df, target_col)
-        
+    elif name == 'hist_gradient_boosting':
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        return HistGradientBoostingRegressor(
+            max_iter=n_estimators,
+            max_depth=15,
+            min_samples_leaf=2,
+            random_state=42
+        )
+    raise ValueError(f"Unknown model: {name}")
+
+def forecast_regressor(df_working, target_col, forecast_timestamps, model, use_lags=False, timings=None, verbose=True):
+    """Forecast using any scikit-learn regressor
+    
+    With use_lags, lag features are added and the forecast is made one step at a time,
+    feeding each prediction back as history for the next step.
+    If timings is a dict, fit and predict wall times in seconds are stored in it.
+    """
+    import pandas as pd
+    import numpy as np
+    
+    # Create features for training data
+    df_train = create_features(df_working)
+    if use_lags:
+        df_train = create_lag_features(df_train, target_col)
+    
+    # Drop rows with NaN (from lag features)
+    df_train_clean = df_train.dropna()
+    
+    if len(df_train_clean) < 10:
+        if verbose:
+            print(f"    Not enough data after creating lag features")
+        return None
+    
+    # Define feature columns
+    feature_cols = FEATURE_COLS + (get_lag_feature_cols(target_col) if use_lags else [])
+    
+    # Prepare training data
+    X_train = df_train_clean[feature_cols]
+    y_train = df_train_clean[target_col]
+    
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    
+    # Prepare forecast data
+    forecast_df = pd.DataFrame({'timestamp': forecast_timestamps})
+    forecast_df = create_features(forecast_df)
+    
+    # Create a combined dataframe for lag feature generation
+    combined_df = pd.concat([
+        df_working[['timestamp', target_col]],
+        forecast_df[['timestamp']].assign(**{target_col: np.nan})
+    ], ignore_index=True)
+    
+    combined_df = create_features(combined_df)
+    
+    start = time.perf_counter()
+    if use_lags:
+        # Recursive forecast: each prediction becomes a lag input of the next step
+        n_history = len(combined_df) - len(forecast_timestamps)
+        predictions = np.zeros(len(forecast_timestamps))
+        for i in range(len(forecast_timestamps)):
+            row = n_history + i
+            window = create_lag_features(combined_df.iloc[max(0, row - max(LAGS)):row + 1], target_col)
+            X_step = window[feature_cols].iloc[[-1]].fillna(0)
+            predictions[i] = max(model.predict(X_step)[0], 0)
+            combined_df.loc[row, target_col] = predictions[i]
+    else:
         # Extract forecast rows
-        forecast_with_lags = combined_df.iloc[-len(forecast_timestamps):].copy()
+        forecast_rows = combined_df.iloc[-len(forecast_timestamps):].copy()
         
         # Make predictions
-        X_forecast = forecast_with_lags[feature_cols]
+        X_forecast = forecast_rows[feature_cols]
         predictions = model.predict(X_forecast)
-        
-        # Get feature importance
+    predict_time = time.perf_counter() - start
+    
+    if timings is not None:
+        timings['fit'] = fit_time
+        timings['predict'] = predict_time
+    
+    # Get feature importance
+    if verbose and hasattr(model, 'feature_importances_'):
         feature_importance = pd.DataFrame({
             'feature': feature_cols,
             'importance': model.feature_importances_
         }).sort_values('importance', ascending=False)
         
         print(f"    Top 5 features: {', '.join(feature_importance.head(5)['feature'].tolist())}")
-        
-        return np.maximum(predictions, 0)  # Ensure non-negative
+    
+    return np.maximum(predictions, 0)  # Ensure non-negative
+
+def forecast_random_forest(df_working, target_col, forecast_timestamps, n_estimators=100, n_jobs=-1):
+    """Forecast using Random Forest Regressor"""
+    try:
+        model = make_regressor('random_forest', n_estimators, n_jobs)
+        return forecast_regressor(df_working, target_col, forecast_timestamps, model)
         
     except Exception as e:
         print(f"    Random Forest failed: {str(e)}")
@@ -244,6 +311,8 @@ def forecast_random_forest(df_working, target_col, forecast_timestamps, n_estima
 
 def forecast_simple_average(series, forecast_length, seasonal_period=24):
     """Simple seasonal average fallback method"""
+    import numpy as np
+    
     if len(series) >= seasonal_period:
         last_period = series[-seasonal_period:]
         n_repeats = (forecast_length // seasonal_period) + 1
@@ -253,16 +322,22 @@ def forecast_simple_average(series, forecast_length, seasonal_period=24):
     
     return np.maximum(forecast, 0)
 
-def forecast_data(input_csv, output_csv, n_estimators=100):
-    """Main forecasting function"""
+def load_working_hours(input_csvs):
+    """Read one or more count CSVs and aggregate them to hourly working-hours data"""
+    import pandas as pd
     
-    if not os.path.exists(input_csv):
-        raise FileNotFoundError(f"Input CSV file not found: {input_csv}")
+    if isinstance(input_csvs, str):
+        input_csvs = [input_csvs]
     
-    print(f"Reading input file: {input_csv}")
+    frames = []
+    for input_csv in input_csvs:
+        if not os.path.exists(input_csv):
+            raise FileNotFoundError(f"Input CSV file not found: {input_csv}")
+        
+        print(f"Reading input file: {input_csv}")
+        frames.append(pd.read_csv(input_csv, usecols=['timestamp', 'incoming_last_interval', 'outgoing_last_interval']))
     
-    # Read and aggregate to hourly
-    df = pd.read_csv(input_csv, usecols=['timestamp', 'incoming_last_interval', 'outgoing_last_interval'])
+    df = pd.concat(frames, ignore_index=True)
     df['timestamp'] = pd.to_datetime(df['timestamp'])
     
     print(f"Aggregating data to hourly level...")
@@ -276,6 +351,15 @@ def forecast_data(input_csv, output_csv, n_estimators=100):
     print(f"Data prepared. Total working hours: {len(df_working)}")
     print(f"Date range: {df_working['timestamp'].min()} to {df_working['timestamp'].max()}")
     
+    return df_working
+
+def build_forecast(df_working, n_estimators=100, n_jobs=-1):
+    """Forecast next day's working hours from hourly working-hours data, training on n_jobs cores"""
+    import pandas as pd
+    
+    if df_working.empty:
+        raise ValueError("No working-hours data available to forecast from")
+    
     # Get last timestamp and forecast hours for NEXT DAY only
     last_timestamp = df_working['timestamp'].max()
     forecast_hours = get_next_day_working_hours(last_timestamp)
@@ -301,7 +385,8 @@ def forecast_data(input_csv, output_csv, n_estimators=100):
             df_working[['timestamp', col]], 
             col, 
             forecast_hours,
-            n_estimators
+            n_estimators,
+            n_jobs
         )
         
         # Fallback if Random Forest fails
@@ -327,6 +412,22 @@ def forecast_data(input_csv, output_csv, n_estimators=100):
     for col in ['incoming_last_interval', 'outgoing_last_interval']:
         result[col] = result[col].round(0).astype(int)
     
+    return result
+
+def forecast_chart_data(result_df):
+    """Convert forecast results into JSON-serializable chart data"""
+    return {
+        'labels': [f'{ts.hour:02d}:00' for ts in result_df['timestamp']],
+        'timestamps': [ts.strftime('%Y-%m-%d %H:%M:%S') for ts in result_df['timestamp']],
+        'incoming': [int(v) for v in result_df['incoming_last_interval']],
+        'outgoing': [int(v) for v in result_df['outgoing_last_interval']],
+    }
+
+def forecast_data(input_csv, output_csv, n_estimators=100, chart='show', dpi=300):
+    """Main forecasting function"""
+    df_working = load_working_hours(input_csv)
+    result = build_forecast(df_working, n_estimators)
+    
     # Determine output path
     output_path = get_output_path(input_csv, output_csv)
     
@@ -335,8 +436,9 @@ def forecast_data(input_csv, output_csv, n_estimators=100):
     print(f"\n✓ Forecast completed and saved to: {output_path}")
     
     # Create and display the timeseries chart
-    print("\nCreating timeseries chart...")
-    create_timeseries_chart(result, output_path)
+    if chart != 'none':
+        print("\nCreating timeseries chart...")
+        create_timeseries_chart(result, output_path, show=chart == 'show', dpi=dpi)
     
     # print(f"\nForecast summary:")
     # print(result)
@@ -344,10 +446,12 @@ def forecast_data(input_csv, output_csv, n_estimators=100):
     # print(result[['incoming_last_interval', 'outgoing_last_interval']].describe())
 
 if __name__ == '__main__':
+    # Only the CLI silences library warnings, importers such as the server keep theirs
+    warnings.filterwarnings('ignore')
     args = parse_arguments()
     
     try:
-        forecast_data(args.csv, args.output, args.n_estimators)
+        forecast_data(args.csv, args.output, args.n_estimators, args.chart, args.dpi)
     except Exception as e:
         print(f"Error: {e}")
         import traceback
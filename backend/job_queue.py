@@ -0,0 +1,103 @@
+import time
+import sqlite3
+from datetime import datetime
+
+class SQLiteJobQueue:
+    """Counting jobs claimed from the server's jobs table by any number of workers
+
+    A worker claims a queued job by taking a lease on it, and keeps the lease
+    with heartbeats while the job runs. When a worker dies its lease expires
+    and the job is claimed again by another worker, up to max_attempts times.
+    Lease times are wall clock seconds, so worker clocks must be in sync.
+    """
+    def __init__(self, db_path, max_attempts=3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def claim(self, worker_id, lease_seconds):
+        """Lease the oldest queued or abandoned job, returns the job row as a dict or None"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Taking the write lock first makes the select and update atomic across workers
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                UPDATE jobs SET status = 'failed', error_message = 'Lease expired too many times', completed_at = ?
+                WHERE status = 'processing' AND lease_expires_at < ? AND attempts >= ?
+            """, (datetime.now().isoformat(), now, self.max_attempts))
+            row = conn.execute("""
+                SELECT * FROM jobs
+                WHERE config_json IS NOT NULL
+                  AND (status = 'queued' OR (status = 'processing' AND lease_expires_at < ?))
+                ORDER BY created_at LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("""
+                UPDATE jobs SET status = 'processing', worker_id = ?, lease_expires_at = ?, attempts = attempts + 1
+                WHERE job_id = ?
+            """, (worker_id, now + lease_seconds, row['job_id']))
+            conn.execute("COMMIT")
+            job = dict(row)
+            job['attempts'] = (job['attempts'] or 0) + 1
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id, worker_id, lease_seconds):
+        """Extend the lease, returns False if the job was claimed by another worker"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("""
+                UPDATE jobs SET lease_expires_at = ?
+                WHERE job_id = ? AND worker_id = ? AND status = 'processing'
+            """, (time.time() + lease_seconds, job_id, worker_id))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, job_id, worker_id):
+        self._finish(job_id, worker_id, 'completed', None)
+
+    def fail(self, job_id, worker_id, error_message):
+        """Requeue the job for another attempt, or mark it failed after max_attempts"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is not None and row['attempts'] < self.max_attempts:
+            self._finish(job_id, worker_id, 'queued', error_message)
+        else:
+            self._finish(job_id, worker_id, 'failed', error_message)
+
+    def release(self, job_id, worker_id):
+        """Give the job back to the queue without using up an attempt, e.g. when the worker shuts down"""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                UPDATE jobs SET status = 'queued', attempts = attempts - 1, lease_expires_at = NULL
+                WHERE job_id = ? AND worker_id = ? AND status = 'processing'
+            """, (job_id, worker_id))
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, worker_id, status, error_message):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                UPDATE jobs SET status = ?, error_message = ?, completed_at = ?, lease_expires_at = NULL
+                WHERE job_id = ? AND worker_id = ? AND status = 'processing'
+            """, (status, error_message, datetime.now().isoformat() if status != 'queued' else None,
+                  job_id, worker_id))
+        finally:
+            conn.close()
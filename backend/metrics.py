@@ -0,0 +1,260 @@
+import os
+import json
+import time
+from bisect import bisect_left
+
+# Histogram buckets in seconds, from a fast pipeline stage up to a long query
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Counter:
+    """Monotonic total per label set"""
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def _merge(self, key, value):
+        self.values[key] = self.values.get(key, 0) + value
+
+    def _samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+class Gauge(Counter):
+    """Current value per label set"""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+class Histogram(Counter):
+    """Bucketed distribution per label set, an observation is a bisect and two additions"""
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            # Per-bucket (not cumulative) counts, the last one is +Inf, then the sum
+            state = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _merge(self, key, value):
+        state = self.values.get(key)
+        if state is None:
+            self.values[key] = list(value)
+        else:
+            for i, count in enumerate(value):
+                state[i] += count
+
+    def _samples(self):
+        bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for key, state in self.values.items():
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", bound),), cumulative
+            yield f"{self.name}_sum", key, state[-1]
+            yield f"{self.name}_count", key, cumulative
+
+class MetricsRegistry:
+    """Metrics of a process, as a JSON snapshot for other processes or in the Prometheus text format"""
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric_class, name, help, labelnames, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = metric_class(name, help, labelnames, **kwargs)
+        return self.metrics[name]
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        return {name: {
+            'type': metric.type,
+            'help': metric.help,
+            'labelnames': list(metric.labelnames),
+            'buckets': list(getattr(metric, 'buckets', [])),
+            'values': [[list(key), value] for key, value in metric.values.items()],
+        } for name, metric in self.metrics.items()}
+
+    def write(self, path):
+        """Write a snapshot atomically, readers never see a partial file"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def merge(self, snapshot, gauge_labels=None):
+        """Add a snapshot's counters and histograms to this registry
+
+        Gauges are only meaningful per process, they are copied with
+        gauge_labels added (e.g. the job they belong to) or skipped.
+        """
+        for name, data in snapshot.items():
+            if data['type'] == 'gauge':
+                if gauge_labels is None:
+                    continue
+                metric = self.gauge(name, data['help'], data['labelnames'] + list(gauge_labels))
+                for key, value in data['values']:
+                    metric.values[tuple(key) + tuple(str(value) for value in gauge_labels.values())] = value
+            elif data['type'] == 'histogram':
+                metric = self.histogram(name, data['help'], data['labelnames'], data['buckets'])
+                for key, value in data['values']:
+                    metric._merge(tuple(key), value)
+            else:
+                metric = self.counter(name, data['help'], data['labelnames'])
+                for key, value in data['values']:
+                    metric._merge(tuple(key), value)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for sample_name, key, value in metric._samples():
+                labels = list(zip(metric.labelnames, key))
+                if len(key) > len(metric.labelnames):
+                    labels.append(key[-1])
+                label_text = ",".join(f'{name}="{escape_label(value)}"' for name, value in labels)
+                lines.append(f"{sample_name}{{{label_text}}} {format_value(value)}" if label_text
+                             else f"{sample_name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def load_snapshot(path):
+    """Read a snapshot written by MetricsRegistry.write, or None"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class MetricsTracer:
+    """Tracer wrapper that also feeds stage durations into a histogram"""
+    def __init__(self, histogram, inner):
+        self.histogram = histogram
+        self.inner = inner
+        self.enabled = inner.enabled
+        self._frame_start = 0.0
+        self._last = 0.0
+
+    def begin_frame(self, frame_count):
+        self.inner.begin_frame(frame_count)
+        self._frame_start = self._last = time.perf_counter()
+
+    def mark(self, stage):
+        self.inner.mark(stage)
+        now = time.perf_counter()
+        self.histogram.observe(now - self._last, stage=stage)
+        self._last = now
+
+    def end_frame(self):
+        self.inner.end_frame()
+        self.histogram.observe(time.perf_counter() - self._frame_start, stage='frame')
+
+    def summary(self):
+        return self.inner.summary()
+
+    def close(self):
+        self.inner.close()
+
+class NullMetrics:
+    """Metrics used when no metrics file is requested, every hook is a no-op"""
+    def wrap_tracer(self, tracer):
+        return tracer
+
+    def frame_processed(self, track_ids, crossings, stride):
+        pass
+
+    def skipped(self, count):
+        pass
+
+    def update(self, dropped_frames, force=False):
+        pass
+
+class PipelineMetrics:
+    """Counting pipeline metrics, written as a snapshot file every interval seconds
+
+    Updates are dict additions on the counting thread. The server reads the
+    snapshot files of running jobs when it is scraped.
+    """
+    def __init__(self, metrics_path, interval=5.0):
+        self.metrics_path = metrics_path
+        self.interval = interval
+        self.registry = MetricsRegistry()
+        self.stage_seconds = self.registry.histogram('counter_stage_seconds', 'Time per counting loop stage and frame', ['stage'])
+        self.processed_total = self.registry.counter('counter_frames_processed_total', 'Frames detected and tracked')
+        self.skipped_total = self.registry.counter('counter_frames_skipped_total', 'Frames skipped without decoding')
+        self.dropped_total = self.registry.counter('counter_frames_dropped_total', 'Stream frames dropped as superseded or stale')
+        self.crossings_total = self.registry.counter('counter_crossings_total', 'Line crossings', ['direction'])
+        self.active_tracks = self.registry.gauge('counter_active_tracks', 'Tracks in the last processed frame')
+        self.stride = self.registry.gauge('counter_stride', 'Frames advanced per processed frame')
+        self.fps = self.registry.gauge('counter_processing_fps', 'Frames processed per second since the last snapshot')
+        self.elapsed = self.registry.gauge('counter_elapsed_seconds', 'Seconds since counting started')
+
+        self.start_time = self.last_write = time.monotonic()
+        self.last_frames = 0
+
+    def wrap_tracer(self, tracer):
+        return MetricsTracer(self.stage_seconds, tracer)
+
+    def frame_processed(self, track_ids, crossings, stride):
+        self.processed_total.inc()
+        for _, direction in crossings:
+            if direction != 'changed':
+                self.crossings_total.inc(direction=direction)
+        self.active_tracks.set(len(track_ids))
+        self.stride.set(stride)
+
+    def skipped(self, count):
+        self.skipped_total.inc(count)
+
+    def update(self, dropped_frames, force=False):
+        """Write a snapshot if the interval has passed, or now if forced"""
+        now = time.monotonic()
+        if not force and now - self.last_write < self.interval:
+            return
+        frames = self.processed_total.get()
+        self.fps.set(round((frames - self.last_frames) / max(now - self.last_write, 1e-6), 2))
+        self.elapsed.set(round(now - self.start_time, 3))
+        self.dropped_total.inc(dropped_frames - self.dropped_total.get())
+        self.last_write, self.last_frames = now, frames
+        self.registry.write(self.metrics_path)
+
+def create_metrics(metrics_path=None, interval=5.0):
+    """Return PipelineMetrics if a metrics file is requested, else NullMetrics"""
+    if metrics_path:
+        return PipelineMetrics(metrics_path, interval)
+    return NullMetrics()
@@ -0,0 +1,204 @@
+"""
+AI Multi-Camera Person Counter
+
+Counts several video sources in one process. The YOLO model is loaded once
+and the frames of all streams are detected in a single batched call, while
+tracking, boundary position and counts are kept per stream.
+
+Created by: Pratik Das
+Date: 2026-10-18
+Version: 1.0
+"""
+
+import os
+import time
+import argparse
+from types import SimpleNamespace
+
+from counter import (PersonTracker, get_crop, get_position, OUTPUT_DIR, MODEL_DIR,
+                     DEFAULT_MODEL, DEFAULT_INTERVAL, CUSTOM_TRACKER)
+from csv_logger import CSVLogger
+
+# Detection confidence, same default model.track() applies for the single-stream counter
+TRACK_CONFIDENCE = 0.1
+
+# Pause before polling again when none of the live streams has a new frame
+IDLE_WAIT = 0.005
+
+def parse_arguments(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Multi-camera person tracking and counting system')
+    parser.add_argument('--source', type=str, nargs=2, action='append', required=True, metavar=('VIDEO', 'DOOR_DIR'),
+                        help='Video source and door direction (up, down, left, right), repeat for each camera')
+    parser.add_argument('--csv_dir', type=str, default=OUTPUT_DIR, help='Directory for the per-stream CSV files')
+    parser.add_argument('--output_dir', type=str, default=None, help='Directory for annotated per-stream output videos (optional)')
+    parser.add_argument('--crop', action='store_true', default=False, help='Crop videos while processing')
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL, help='Interval in seconds for logging counts')
+    parser.add_argument('--stream', action='store_true', default=False, help='Treat the sources as live streams')
+    parser.add_argument('--realtime', action='store_true', default=False, help='Replay video files at real-time speed as live streams')
+    parser.add_argument('--reconnect_attempts', type=int, default=-1, help='Stream mode: reconnect attempts per outage before giving up (-1 for unlimited)')
+    parser.add_argument('--model', type=str, default=f"{MODEL_DIR}/{DEFAULT_MODEL}", help='Path to YOLO model')
+    parser.add_argument('--tracker', type=str, default=CUSTOM_TRACKER, help='Tracker configuration applied to every stream')
+    args = parser.parse_args(argv)
+
+    for _, door_dir in args.source:
+        if door_dir not in ["up", "down", "left", "right"]:
+            parser.error(f"invalid door direction: {door_dir}")
+    return args
+
+def create_tracker(tracker_config, frame_rate):
+    """Create an ultralytics BoT-SORT/ByteTrack instance from a tracker YAML"""
+    from ultralytics.trackers import BOTSORT, BYTETracker
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+    try:
+        from ultralytics.utils import YAML
+        cfg = YAML.load(check_yaml(tracker_config))
+    except ImportError:
+        from ultralytics.utils import yaml_load
+        cfg = yaml_load(check_yaml(tracker_config))
+
+    cfg = IterableSimpleNamespace(**cfg)
+    if cfg.tracker_type == "botsort" and getattr(cfg, "with_reid", False) and getattr(cfg, "model", None) == "auto":
+        # "auto" ReID reuses features hooked out of model.track(), which batched predict() does not provide
+        cfg.with_reid = False
+    tracker_class = BYTETracker if cfg.tracker_type == "bytetrack" else BOTSORT
+    return tracker_class(args=cfg, frame_rate=int(frame_rate or 30))
+
+class StreamCounter:
+    """Per-stream state: source, crop, boundary, tracker, counts and outputs"""
+    def __init__(self, name, video, door_dir, args):
+        from video_source import open_source
+
+        self.name = name
+        self.source = open_source(SimpleNamespace(video=video, stream=args.stream, realtime=args.realtime,
+                                                  reconnect_attempts=args.reconnect_attempts))
+        if not self.source.is_opened():
+            raise RuntimeError(f"Could not open video {video}")
+
+        self.width, self.height = self.source.width, self.source.height
+        self.crop = None
+        if args.crop:
+            self.crop = get_crop(self.width, self.height)
+            self.width, self.height = self.width // 2, self.height // 2
+
+        self.position = get_position(door_dir, self.width, self.height)
+        self.counter = PersonTracker(None)
+        self.tracker = create_tracker(args.tracker, self.source.fps)
+        self.csv_path = os.path.join(args.csv_dir, f"{name}.csv")
+        self.csv_logger = CSVLogger(self.csv_path, self.source.fps, args.interval)
+
+        self.out = None
+        self.annotator = None
+        if args.output_dir:
+            import cv2
+            from annotator import Annotator
+            self.annotator = Annotator(self.width, self.height, self.position)
+            self.out = cv2.VideoWriter(os.path.join(args.output_dir, f"{name}.mp4"),
+                                       cv2.VideoWriter_fourcc(*'mp4v'), self.source.fps, (self.width, self.height))
+
+        self.frame = None
+        self.frame_count = 0
+        self.last_processed = 0
+        self.finished = False
+
+    def read(self):
+        """Read the next frame of the stream, marking it finished at the end
+
+        Live streams are not waited for: None without finished means the
+        camera has no new frame yet (or is reconnecting) and sits out this batch.
+        """
+        if self.source.is_stream:
+            frame_data = self.source.read(timeout=0)
+            if frame_data is None:
+                self.finished = self.source.finished
+                return None
+        else:
+            frame_data = self.source.read()
+            if frame_data is None:
+                self.finished = True
+                return None
+        self.frame, self.frame_count, _ = frame_data
+        if self.crop:
+            top, bottom, left, right = self.crop
+            self.frame = self.frame[top:bottom, left:right]
+        return self.frame
+
+    def update(self, result):
+        """Track this stream's detections and update its counts"""
+        tracks = self.tracker.update(result.boxes.cpu().numpy(), self.frame)
+        if len(tracks):
+            boxes = tracks[:, :4].astype(int)
+            track_ids = tracks[:, 4].astype(int)
+        else:
+            boxes, track_ids = [], []
+
+        # Frames dropped by a live source since the last update still age the tracks
+        elapsed = self.frame_count - self.last_processed
+        self.last_processed = self.frame_count
+        self.counter.update_counts(boxes, track_ids, self.position, elapsed)
+        self.csv_logger.log_counts(self.frame_count, self.counter.counts)
+
+        if self.out:
+            self.annotator.draw(self.frame, self.frame_count, self.counter.counts, track_ids, self.counter.track_history)
+            self.out.write(self.frame)
+
+    def release(self):
+        self.source.release()
+        if self.out:
+            self.out.release()
+
+def get_stream_names(sources):
+    """Unique output names for the sources, based on their file or URL names"""
+    names = []
+    for i, (video, _) in enumerate(sources):
+        name = os.path.basename(str(video).rstrip('/')).split('.')[0] or f"stream{i}"
+        if name in names:
+            name = f"{name}_{i}"
+        names.append(name)
+    return names
+
+def process_streams(args):
+    """Count all sources with one shared model and batched detection"""
+    from ultralytics import YOLO
+    from tqdm import tqdm
+
+    os.makedirs(args.csv_dir, exist_ok=True)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    streams = [StreamCounter(name, video, door_dir, args)
+               for name, (video, door_dir) in zip(get_stream_names(args.source), args.source)]
+    model = YOLO(args.model)
+
+    pbar = tqdm(desc="Processing batches")
+    try:
+        while True:
+            active = [stream for stream in streams if not stream.finished]
+            if not active:
+                break
+            frames = [stream.read() for stream in active]
+            batch = [(stream, frame) for stream, frame in zip(active, frames) if frame is not None]
+            if not batch:
+                # Every live stream is between frames or reconnecting
+                time.sleep(IDLE_WAIT)
+                continue
+
+            # One detector call for the frames of all streams
+            results = model.predict([frame for _, frame in batch], classes=0, conf=TRACK_CONFIDENCE, verbose=False)
+            for (stream, _), result in zip(batch, results):
+                stream.update(result)
+            pbar.update(1)
+    except KeyboardInterrupt:
+        print("Stopped by user")
+
+    pbar.close()
+    for stream in streams:
+        stream.release()
+        print(f"{stream.name}: {stream.counter.counts} (CSV data saved to {stream.csv_path})")
+
+    return {stream.name: stream.counter.counts for stream in streams}
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    process_streams(args)
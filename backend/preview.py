@@ -0,0 +1,84 @@
+import os
+import time
+import threading
+
+import cv2
+
+class PreviewWriter:
+    """Publishes the latest annotated frame as a small JPEG for the browser preview
+
+    Frames are only taken while someone is watching, which the server signals
+    by touching "<preview_path>.watch", and at most max_fps times per second.
+    Frames are downscaled on the counting thread and JPEG-encoded and written
+    on a background thread that only keeps the newest frame, so a slow encode
+    drops preview frames instead of delaying counting.
+    """
+    def __init__(self, preview_path, max_fps=5.0, width=640, quality=70, watch_timeout=3.0):
+        self.preview_path = preview_path
+        self.watch_path = preview_path + ".watch"
+        self.min_interval = 1.0 / max_fps
+        self.width = width
+        self.quality = quality
+        self.watch_timeout = watch_timeout
+
+        self.last_submit = 0.0
+        self.last_watch_check = 0.0
+        self.watching = False
+
+        self._latest = None
+        self._finished = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wants_frame(self):
+        """Whether a frame should be submitted now"""
+        now = time.monotonic()
+        if now - self.last_submit < self.min_interval:
+            return False
+        if now - self.last_watch_check >= 1.0:
+            # Checked at most once per second to keep the stat off the per-frame path
+            self.last_watch_check = now
+            try:
+                self.watching = time.time() - os.path.getmtime(self.watch_path) < self.watch_timeout
+            except OSError:
+                self.watching = False
+        return self.watching
+
+    def submit(self, frame):
+        """Hand a frame to the encoder thread, replacing one not encoded yet"""
+        self.last_submit = time.monotonic()
+        height, width = frame.shape[:2]
+        if width > self.width:
+            frame = cv2.resize(frame, (self.width, height * self.width // width), interpolation=cv2.INTER_AREA)
+        else:
+            frame = frame.copy()
+        with self._condition:
+            self._latest = frame
+            self._condition.notify()
+
+    def _run(self):
+        tmp_path = self.preview_path + ".tmp"
+        while True:
+            with self._condition:
+                while self._latest is None and not self._finished:
+                    self._condition.wait()
+                if self._finished:
+                    return
+                frame, self._latest = self._latest, None
+
+            success, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if success:
+                with open(tmp_path, 'wb') as f:
+                    f.write(jpeg.tobytes())
+                # Readers never see a partly written image
+                os.replace(tmp_path, self.preview_path)
+
+    def close(self):
+        """Stop the encoder thread and remove the preview image"""
+        with self._condition:
+            self._finished = True
+            self._condition.notify()
+        self._thread.join(timeout=2)
+        if os.path.exists(self.preview_path):
+            os.remove(self.preview_path)
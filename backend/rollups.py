@@ -0,0 +1,140 @@
+import os
+import csv
+from collections import defaultdict
+
+from csv_tail import read_tail, has_new_lines
+
+# Rollup table of each granularity, buckets are "YYYY-MM-DD HH:00:00" and "YYYY-MM-DD" strings
+ROLLUP_TABLES = {'hourly': 'rollups_hourly', 'daily': 'rollups_daily'}
+
+def init_rollups(conn):
+    """Create the rollup tables
+
+    rollups_hourly / rollups_daily hold the in/out totals per site and bucket.
+    rollup_job_hourly keeps each job's share, so a job can be taken out again,
+    and rollup_offsets the bytes of each count CSV already added with the
+    last line added, to notice a CSV rewritten by a resumed run.
+    """
+    for table in ROLLUP_TABLES.values():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                site TEXT,
+                bucket TEXT,
+                incoming INTEGER,
+                outgoing INTEGER,
+                PRIMARY KEY (site, bucket)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_job_hourly (
+            job_id TEXT,
+            bucket TEXT,
+            incoming INTEGER,
+            outgoing INTEGER,
+            PRIMARY KEY (job_id, bucket)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_offsets (
+            job_id TEXT PRIMARY KEY,
+            csv_offset INTEGER,
+            csv_last_line BLOB
+        )
+    """)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(rollup_offsets)")]
+    if 'csv_last_line' not in columns:
+        conn.execute("ALTER TABLE rollup_offsets ADD COLUMN csv_last_line BLOB")
+
+def _add(conn, table, key_column, key, bucket, incoming, outgoing):
+    conn.execute(f"""
+        INSERT INTO {table} ({key_column}, bucket, incoming, outgoing) VALUES (?, ?, ?, ?)
+        ON CONFLICT ({key_column}, bucket) DO UPDATE SET
+            incoming = incoming + excluded.incoming,
+            outgoing = outgoing + excluded.outgoing
+    """, (key, bucket, incoming, outgoing))
+
+def _remove_job(conn, job_id, site):
+    """Subtract a job's share from the site rollups"""
+    rows = conn.execute("SELECT bucket, incoming, outgoing FROM rollup_job_hourly WHERE job_id = ?", (job_id,)).fetchall()
+    for bucket, incoming, outgoing in rows:
+        _add(conn, 'rollups_hourly', 'site', site, bucket, -incoming, -outgoing)
+        _add(conn, 'rollups_daily', 'site', site, bucket[:10], -incoming, -outgoing)
+    conn.execute("DELETE FROM rollup_job_hourly WHERE job_id = ?", (job_id,))
+
+def ingest_job(conn, job_id, site, csv_path):
+    """Add the interval rows appended to a job's count CSV since the last ingest, returns the number of rows
+
+    Safe to call repeatedly while the job is running and from several processes.
+    """
+    if not csv_path or not os.path.exists(csv_path):
+        return 0
+
+    # Checked without the write lock, so polling unchanged jobs does not compete with writers
+    row = conn.execute("SELECT csv_offset, csv_last_line FROM rollup_offsets WHERE job_id = ?", (job_id,)).fetchone()
+    if not has_new_lines(csv_path, *(row or (0, None))):
+        return 0
+
+    # The write lock is taken first, so concurrent ingests of a job do not both add the same rows
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT csv_offset, csv_last_line FROM rollup_offsets WHERE job_id = ?", (job_id,)).fetchone()
+        offset, last_line = (row[0], row[1]) if row else (0, None)
+        lines, new_offset, last_line, reset = read_tail(csv_path, offset, last_line)
+        if reset:
+            # Rewritten by a resumed run: take the job out and ingest it again
+            _remove_job(conn, job_id, site)
+        if new_offset == offset and not reset:
+            conn.commit()
+            return 0
+
+        hourly = defaultdict(lambda: [0, 0])
+        rows = 0
+        for values in csv.reader(lines):
+            if len(values) != 4 or values[0] == 'timestamp':
+                continue
+            timestamp, _, incoming, outgoing = values
+            try:
+                incoming, outgoing = int(incoming), int(outgoing)
+            except ValueError:
+                # A malformed line is skipped, it must not stop the job's later rows from being added
+                continue
+            bucket = timestamp[:13] + ":00:00"
+            hourly[bucket][0] += incoming
+            hourly[bucket][1] += outgoing
+            rows += 1
+
+        for bucket, (incoming, outgoing) in hourly.items():
+            _add(conn, 'rollup_job_hourly', 'job_id', job_id, bucket, incoming, outgoing)
+            _add(conn, 'rollups_hourly', 'site', site, bucket, incoming, outgoing)
+            _add(conn, 'rollups_daily', 'site', site, bucket[:10], incoming, outgoing)
+        conn.execute("""
+            INSERT INTO rollup_offsets (job_id, csv_offset, csv_last_line) VALUES (?, ?, ?)
+            ON CONFLICT (job_id) DO UPDATE SET csv_offset = excluded.csv_offset, csv_last_line = excluded.csv_last_line
+        """, (job_id, new_offset, last_line))
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+
+def query_rollups(conn, granularity, site=None, start=None, end=None):
+    """In/out totals per bucket from start (inclusive) to end (exclusive), summed over sites unless one is given"""
+    table = ROLLUP_TABLES[granularity]
+    conditions, params = [], []
+    if site:
+        conditions.append("site = ?")
+        params.append(site)
+    if start:
+        conditions.append("bucket >= ?")
+        params.append(start)
+    if end:
+        conditions.append("bucket < ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    rows = conn.execute(f"""
+        SELECT bucket, SUM(incoming), SUM(outgoing) FROM {table} {where}
+        GROUP BY bucket ORDER BY bucket
+    """, params).fetchall()
+    return [{'bucket': bucket, 'incoming': incoming, 'outgoing': outgoing} for bucket, incoming, outgoing in rows]
@@ -0,0 +1,72 @@
+import math
+
+# Frames an approaching track should be sampled in before it reaches the line
+SAMPLES_BEFORE_LINE = 3
+
+class FixedSampler:
+    """Processes every stride-th frame, as set by --skip_frames"""
+    def __init__(self, stride=1):
+        self.stride = max(stride, 1)
+
+    def next_stride(self, track_ids, track_history, elapsed, processing_time):
+        return self.stride
+
+class AdaptiveSampler:
+    """Chooses the stride to the next processed frame from the scene and a time budget
+
+    Tracks near the counting line, or new tracks whose motion is not known
+    yet, are sampled at min_stride. Otherwise the stride is limited so an
+    approaching track is still sampled a few times before it reaches the
+    line, up to max_stride for a quiet scene. With a cpu_budget (processing
+    time as a fraction of video time) the stride is raised until the average
+    processing time fits. The stride drops at once when activity starts and
+    grows by one per processed frame.
+    """
+    def __init__(self, position, frame_width, frame_height, fps, min_stride=1, max_stride=4,
+                 near_fraction=0.15, cpu_budget=None):
+        self.position = position
+        self.axis = 1 if position.line_orientation == "horizontal" else 0
+        self.near_distance = near_fraction * (frame_height if self.axis == 1 else frame_width)
+        self.fps = fps
+        self.min_stride = max(min_stride, 1)
+        self.max_stride = max(max_stride, self.min_stride)
+        self.cpu_budget = cpu_budget
+
+        self.stride = self.min_stride
+        self.average_time = None
+
+    def _motion_stride(self, track_ids, track_history, elapsed):
+        stride = self.max_stride
+        for track_id in track_ids:
+            history = track_history[track_id]
+            distance = abs(history[-1][self.axis] - self.position.boundary_cords)
+            if distance <= self.near_distance or len(history) < 2:
+                return self.min_stride
+
+            # Pixels per source frame across the line
+            speed = abs(history[-1][self.axis] - history[-2][self.axis]) / elapsed
+            if speed > 0:
+                stride = min(stride, int(distance / speed / SAMPLES_BEFORE_LINE))
+        return max(stride, self.min_stride)
+
+    def next_stride(self, track_ids, track_history, elapsed, processing_time):
+        """Frames to advance after the current one, given how many were advanced to reach it"""
+        stride = self._motion_stride(track_ids, track_history, elapsed)
+
+        if self.cpu_budget:
+            if self.average_time is None:
+                self.average_time = processing_time
+            else:
+                self.average_time = 0.9 * self.average_time + 0.1 * processing_time
+            budget_stride = math.ceil(self.average_time * self.fps / self.cpu_budget)
+            stride = max(stride, min(budget_stride, self.max_stride))
+
+        self.stride = min(stride, self.stride + 1)
+        return self.stride
+
+def create_sampler(args, position, frame_width, frame_height, fps):
+    """Frame sampler selected by the command line arguments"""
+    if args.adaptive:
+        return AdaptiveSampler(position, frame_width, frame_height, fps, max(args.skip_frames, 1),
+                               args.max_stride, cpu_budget=args.cpu_budget)
+    return FixedSampler(args.skip_frames)
@@ -0,0 +1,93 @@
+import os
+import math
+
+import cv2
+
+PLAYLIST_NAME = "playlist.m3u8"
+
+class SegmentWriter:
+    """Writes the output video as short MP4 segments listed in an HLS-style playlist
+
+    Drop-in for cv2.VideoWriter. Every finished segment is a complete file and
+    is added to the playlist right away, so the video can be watched while
+    counting is still running. On resume the finished segments of the
+    previous run are kept and numbering continues after them. keep_segments
+    limits them to those finished at the checkpoint, later ones hold frames
+    that are processed again.
+    """
+    def __init__(self, segments_dir, fps, frame_size, segment_seconds=10, resume=False, keep_segments=None):
+        self.segments_dir = segments_dir
+        self.fps = fps
+        self.frame_size = frame_size
+        self.segment_frames = max(int(segment_seconds * fps), 1)
+        self.playlist_path = os.path.join(segments_dir, PLAYLIST_NAME)
+
+        os.makedirs(segments_dir, exist_ok=True)
+        self.segments = []
+        if resume:
+            self.segments = read_playlist(self.playlist_path)
+            if keep_segments is not None:
+                for name, _ in self.segments[keep_segments:]:
+                    path = os.path.join(segments_dir, name)
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.segments = self.segments[:keep_segments]
+            # Reopened, later segments are appended again
+            self._write_playlist(ended=False)
+        self.writer = None
+        self.segment_name = None
+        self.frames_written = 0
+
+    def write(self, frame):
+        if self.writer is None:
+            self.segment_name = f"segment_{len(self.segments):05d}.mp4"
+            self.writer = cv2.VideoWriter(os.path.join(self.segments_dir, self.segment_name),
+                                          cv2.VideoWriter_fourcc(*'mp4v'), self.fps, self.frame_size)
+            self.frames_written = 0
+
+        self.writer.write(frame)
+        self.frames_written += 1
+        if self.frames_written >= self.segment_frames:
+            self._finish_segment()
+
+    def _finish_segment(self):
+        self.writer.release()
+        self.writer = None
+        self.segments.append((self.segment_name, self.frames_written / self.fps))
+        self._write_playlist(ended=False)
+
+    def _write_playlist(self, ended):
+        target_duration = math.ceil(max([duration for _, duration in self.segments] + [1]))
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target_duration}",
+                 "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:EVENT"]
+        for name, duration in self.segments:
+            lines.extend([f"#EXTINF:{duration:.3f},", name])
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+
+        tmp_path = self.playlist_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.playlist_path)
+
+    def release(self):
+        """Finish the last segment and close the playlist"""
+        if self.writer is not None:
+            self._finish_segment()
+        self._write_playlist(ended=True)
+
+def read_playlist(playlist_path):
+    """[(segment name, duration)] of a playlist written by SegmentWriter"""
+    segments = []
+    if not os.path.exists(playlist_path):
+        return segments
+    with open(playlist_path, 'r') as f:
+        duration = None
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].rstrip(","))
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((line, duration))
+                duration = None
+    return segments
@@ -9,16 +9,28 @@ Version: 1.0
 import sys
 import os
 import uuid
+import json
+import time
+import asyncio
+import hashlib
+import threading
 import subprocess
 from typing import Optional, Literal
 from datetime import datetime
 import csv
-from fastapi import FastAPI, File, Form, UploadFile, BackgroundTasks, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, BackgroundTasks, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, FileResponse
 from pydantic import BaseModel, Field
 import sqlite3
 from dotenv import load_dotenv
 
+from worker import build_counter_command
+from checkpoint import INTERRUPTED_EXIT_CODE, get_output_parts
+from rollups import init_rollups, ingest_job, query_rollups
+from count_data import get_count_data, negotiate_media_type, negotiate_encoding
+from metrics import MetricsRegistry, load_snapshot
+
 load_dotenv()
 
 # Directories
@@ -36,6 +48,17 @@ DEFAULT_CONFIDENCE = os.getenv("DEFAULT_CONFIDENCE")
 DEFAULT_SKIP_FRAMES = os.getenv("DEFAULT_SKIP_FRAMES")
 DEFAULT_DOOR_DIR = os.getenv("DEFAULT_DOOR_DIR")
 DEFAULT_INTERVAL = os.getenv("DEFAULT_INTERVAL")
+DEFAULT_SITE = os.getenv("DEFAULT_SITE", "default")
+
+# Job Execution: "local" runs jobs in the server process, "queue" leaves them to worker.py
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "local")
+
+# Forecast Configuration
+FORECAST_N_ESTIMATORS = int(os.getenv("FORECAST_N_ESTIMATORS", 100))
+# Cores used by forecast training, which runs in the API process and would otherwise take all of them
+FORECAST_N_JOBS = int(os.getenv("FORECAST_N_JOBS", 1))
+# Seconds before new counts retrain a site's forecast again, a stale forecast is served meanwhile
+FORECAST_MIN_INTERVAL = int(os.getenv("FORECAST_MIN_INTERVAL", 300))
 
 app = FastAPI(title="People Counter API")
 
@@ -50,6 +73,7 @@ app.add_middleware(
 
 # Configuration
 DB_PATH = "counter_jobs.db"
+SERVER_START = datetime.now().isoformat()
 os.makedirs(INPUT_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(MODEL_DIR, exist_ok=True)
@@ -74,6 +98,35 @@ def init_db():
             error_message TEXT
         )
     """)
+    # Add columns introduced after the initial schema
+    new_columns = {
+        "site": f"TEXT DEFAULT '{DEFAULT_SITE}'",
+        "tracks_path": "TEXT",
+        "config_json": "TEXT",
+        "worker_id": "TEXT",
+        "lease_expires_at": "REAL",
+        "attempts": "INTEGER DEFAULT 0",
+        "output_video_parts": "TEXT",
+    }
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(jobs)")]
+    for column, column_type in new_columns.items():
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS forecasts (
+            forecast_id TEXT PRIMARY KEY,
+            site TEXT,
+            data_version TEXT,
+            status TEXT,
+            result TEXT,
+            created_at TEXT,
+            completed_at TEXT,
+            error_message TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_site ON jobs (site)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_forecasts_site ON forecasts (site, data_version)")
+    init_rollups(conn)
     conn.commit()
     conn.close()
 
@@ -84,9 +137,15 @@ class CountingConfig(BaseModel):
     door_direction: Literal["up", "down", "left", "right"] = Field(DEFAULT_DOOR_DIR, description="Direction of the door")
     confidence: float = Field(DEFAULT_CONFIDENCE, ge=0.0, le=1.0, description="Confidence threshold")
     skip_frames: int = Field(DEFAULT_SKIP_FRAMES, ge=0, le=2, description="Number of frames to skip")
+    adaptive_sampling: bool = Field(False, description="Adapt the frames skipped to activity near the line")
+    max_stride: int = Field(4, ge=1, le=10, description="Adaptive sampling: process at least every this many frames")
     crop: bool = Field(False, description="Enable center crop")
-    show_preview: bool = Field(True, description="Show preview")
+    show_preview: bool = Field(True, description="Publish a live preview while counting")
+    preview_fps: float = Field(5.0, gt=0.0, le=30.0, description="Maximum live preview frame rate")
     interval: int = Field(DEFAULT_INTERVAL, ge=0, description="Interval between counts")
+    render_video: bool = Field(True, description="Render the annotated video while counting, otherwise on request")
+    record_clips: bool = Field(False, description="Save short annotated clips around crossings")
+    segment_seconds: int = Field(0, ge=0, description="Write the annotated video as segments of this length, viewable while counting")
 
 class JobResponse(BaseModel):
     job_id: str
@@ -96,17 +155,55 @@ class JobResponse(BaseModel):
 class StatusResponse(BaseModel):
     job_id: str
     status: str
+    site: Optional[str]
     video_path: Optional[str]
     output_video_path: Optional[str]
+    output_video_parts: Optional[list]
     csv_path: Optional[str]
     latest_data: Optional[dict]
     error_message: Optional[str]
     created_at: str
     completed_at: Optional[str]
 
+class ForecastResponse(BaseModel):
+    forecast_id: Optional[str]
+    site: str
+    status: str
+    data_version: str
+    cached: bool
+    stale: bool = False
+    result: Optional[dict]
+    error_message: Optional[str]
+
+# Metrics of the server process. Jobs finished since the server started are
+# folded into finished_totals once, running jobs are read on every scrape.
+server_metrics = MetricsRegistry()
+sqlite_query_seconds = server_metrics.histogram('sqlite_query_seconds', 'SQLite statement execution time in the API server')
+job_duration_seconds = server_metrics.histogram('counter_job_duration_seconds', 'Time from submission to completion of finished jobs', ['status'],
+                                                buckets=(10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400))
+finished_totals = MetricsRegistry()
+folded_jobs = set()
+metrics_lock = threading.Lock()
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            sqlite_query_seconds.observe(time.perf_counter() - start)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements are timed into sqlite_query_seconds"""
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
 # Helper functions
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=TimedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -126,33 +223,218 @@ def read_latest_csv_row(csv_path: str) -> Optional[dict]:
         print(f"Error reading CSV: {e}")
         return None
 
-def process_video_task(job_id: str, video_path: str, config: CountingConfig, output_video_path: str, csv_path: str):
-    """Background task to process video"""
+# Forecast cache: site -> {"data_version": ..., "forecast_id": ..., "result": ...}
+forecast_cache = {}
+forecast_cache_lock = threading.Lock()
+forecast_start_lock = threading.Lock()
+
+def get_site_csv_paths(site: str) -> list:
+    """Get the count CSV files of all jobs recorded for a site"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT csv_path FROM jobs WHERE site = ? AND csv_path IS NOT NULL ORDER BY created_at", (site,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [row['csv_path'] for row in rows if os.path.exists(row['csv_path'])]
+
+def get_data_version(csv_paths: list) -> str:
+    """Fingerprint count CSVs by path, size and modification time"""
+    digest = hashlib.sha1()
+    for csv_path in csv_paths:
+        stat = os.stat(csv_path)
+        digest.update(f"{csv_path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+def update_rollups(status: Optional[str] = None):
+    """Add new count CSV rows of jobs (only those with the given status if set) to the rollups"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if status:
+        cursor.execute("SELECT job_id, site, csv_path FROM jobs WHERE status = ?", (status,))
+    else:
+        cursor.execute("SELECT job_id, site, csv_path FROM jobs")
+    for row in cursor.fetchall():
+        ingest_job(conn, row['job_id'], row['site'], row['csv_path'])
+    conn.close()
+
+def invalidate_forecast(site: str):
+    """Drop the cached forecast of a site after new counts arrive"""
+    with forecast_cache_lock:
+        forecast_cache.pop(site, None)
+
+def forecast_task(forecast_id: str, site: str, data_version: str, csv_paths: list):
+    """Background task to train the forecast model for a site"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        # Update status to processing
-        cursor.execute("UPDATE jobs SET status = ? WHERE job_id = ?", ("processing", job_id))
+        cursor.execute("UPDATE forecasts SET status = ? WHERE forecast_id = ?", ("training", forecast_id))
         conn.commit()
         
-        # Build command
+        # Imported here to keep the heavy ML stack out of server startup
+        import forecast
+        
+        df_working = forecast.load_working_hours(csv_paths)
+        result = forecast.build_forecast(df_working, FORECAST_N_ESTIMATORS, FORECAST_N_JOBS)
+        chart_data = forecast.forecast_chart_data(result)
+        
+        cursor.execute(
+            "UPDATE forecasts SET status = ?, result = ?, completed_at = ? WHERE forecast_id = ?",
+            ("completed", json.dumps(chart_data), datetime.now().isoformat(), forecast_id)
+        )
+        conn.commit()
+        
+        with forecast_cache_lock:
+            forecast_cache[site] = {"data_version": data_version, "forecast_id": forecast_id, "result": chart_data}
+        
+    except Exception as e:
+        cursor.execute(
+            "UPDATE forecasts SET status = ?, error_message = ?, completed_at = ? WHERE forecast_id = ?",
+            ("failed", str(e), datetime.now().isoformat(), forecast_id)
+        )
+        conn.commit()
+    
+    finally:
+        conn.close()
+
+def forecast_response(site: str, row, stale: bool = False) -> ForecastResponse:
+    """ForecastResponse of a forecasts row"""
+    return ForecastResponse(forecast_id=row['forecast_id'], site=site, status=row['status'],
+                            data_version=row['data_version'], cached=row['status'] == "completed", stale=stale,
+                            result=json.loads(row['result']) if row['result'] else None,
+                            error_message=row['error_message'])
+
+def get_or_start_forecast(site: str, background_tasks: BackgroundTasks, force: bool = False) -> ForecastResponse:
+    """Serve a forecast from cache, or the last completed one flagged stale while the current data version trains"""
+    csv_paths = get_site_csv_paths(site)
+    if not csv_paths:
+        raise HTTPException(status_code=404, detail="No count data found for site")
+    
+    data_version = get_data_version(csv_paths)
+    
+    if not force:
+        # Fast path: in-memory cache
+        with forecast_cache_lock:
+            cached = forecast_cache.get(site)
+        if cached and cached["data_version"] == data_version:
+            return ForecastResponse(forecast_id=cached["forecast_id"], site=site, status="completed",
+                                    data_version=data_version, cached=True, result=cached["result"], error_message=None)
+    
+    # Checking for a training and queueing one happen under one lock, concurrent requests start at most one
+    with forecast_start_lock:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM forecasts WHERE site = ? AND data_version = ? ORDER BY created_at DESC LIMIT 1",
+            (site, data_version)
+        )
+        row = cursor.fetchone()
+        if row and row['status'] == "completed" and not force:
+            conn.close()
+            # Warm the in-memory cache from the database (e.g. after a restart)
+            with forecast_cache_lock:
+                forecast_cache[site] = {"data_version": data_version, "forecast_id": row['forecast_id'],
+                                        "result": json.loads(row['result'])}
+            return forecast_response(site, row)
+        if row and row['status'] == "failed" and not force:
+            conn.close()
+            return forecast_response(site, row)
+        
+        cursor.execute(
+            "SELECT * FROM forecasts WHERE site = ? AND status = 'completed' ORDER BY completed_at DESC LIMIT 1",
+            (site,)
+        )
+        latest = cursor.fetchone()
+        cursor.execute(
+            "SELECT * FROM forecasts WHERE site = ? AND status IN ('queued', 'training') ORDER BY created_at DESC LIMIT 1",
+            (site,)
+        )
+        pending = cursor.fetchone()
+        
+        # While counting runs the data version changes with every interval row, retraining is
+        # limited to one at a time and, unless forced, one per FORECAST_MIN_INTERVAL seconds
+        recent = latest is not None and (
+            datetime.now() - datetime.fromisoformat(latest['completed_at'])).total_seconds() < FORECAST_MIN_INTERVAL
+        if pending is None and (force or not recent):
+            forecast_id = str(uuid.uuid4())
+            cursor.execute(
+                "INSERT INTO forecasts (forecast_id, site, data_version, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (forecast_id, site, data_version, "queued", datetime.now().isoformat())
+            )
+            conn.commit()
+            background_tasks.add_task(forecast_task, forecast_id, site, data_version, csv_paths)
+            pending = {'forecast_id': forecast_id, 'status': "queued", 'data_version': data_version,
+                       'result': None, 'error_message': None}
+        conn.close()
+    
+    if latest is not None:
+        return forecast_response(site, latest, stale=True)
+    return forecast_response(site, pending)
+
+def get_tracks_path(job_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, f"{job_id}_tracks.csv")
+
+def get_clips_dir(job_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, f"{job_id}_clips")
+
+def get_checkpoint_path(job_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, f"{job_id}_checkpoint.json")
+
+def get_preview_path(job_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, f"{job_id}_preview.jpg")
+
+def get_metrics_path(job_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, f"{job_id}_metrics.json")
+
+def get_segments_dir(job_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, f"{job_id}_output_segments")
+
+def get_playlist_path(job_id: str) -> str:
+    return os.path.join(get_segments_dir(job_id), "playlist.m3u8")
+
+def render_video_task(job_id: str, video_path: str, tracks_path: str, door_direction: str, crop: bool, output_video_path: str):
+    """Background task to render the annotated video of a count-only job"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
         cmd = [
             sys.executable,
-            "counter.py",
+            "annotate.py",
             video_path,
-            config.door_direction,
-            "--output", output_video_path,
-            "--csv_output", csv_path,
-            "--skip_frames", str(config.skip_frames),
-            "--conf", str(config.confidence),
-            "--interval", str(config.interval)
+            tracks_path,
+            door_direction,
+            "--output", output_video_path
         ]
-        
-        if config.crop:
+        if crop:
             cmd.append("--crop")
-        if config.show_preview:
-            cmd.append("--show")
+        
+        print("Command executed:", " ".join(cmd))
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        
+        if result.returncode == 0:
+            cursor.execute("UPDATE jobs SET output_video_path = ? WHERE job_id = ?", (output_video_path, job_id))
+        else:
+            cursor.execute("UPDATE jobs SET error_message = ? WHERE job_id = ?", (result.stderr or "Rendering failed", job_id))
+        conn.commit()
+    
+    finally:
+        conn.close()
+
+def process_video_task(job_id: str, video_path: str, config: CountingConfig, output_video_path: str, csv_path: str, site: str = DEFAULT_SITE):
+    """Background task to process video"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        # Update status to processing
+        cursor.execute("UPDATE jobs SET status = ? WHERE job_id = ?", ("processing", job_id))
+        conn.commit()
+        
+        # Build command
+        cmd = build_counter_command(config.__dict__, video_path, csv_path, get_tracks_path(job_id), output_video_path,
+                                    get_clips_dir(job_id), get_checkpoint_path(job_id), get_preview_path(job_id),
+                                    get_metrics_path(job_id))
         
         # Run the counter script
         print("Command executed:", " ".join(cmd))
@@ -162,11 +444,16 @@ def process_video_task(job_id: str, video_path: str, config: CountingConfig, out
 
         if result.returncode == 0:
             # Success
+            # A resumed job wrote its video in parts, they are served by /api/video/{job_id}/part/{index}
+            parts = get_output_parts(get_checkpoint_path(job_id))
             cursor.execute(
-                "UPDATE jobs SET status = ?, completed_at = ? WHERE job_id = ?",
-                ("completed", datetime.now().isoformat(), job_id)
+                "UPDATE jobs SET status = ?, completed_at = ?, output_video_parts = ? WHERE job_id = ?",
+                ("completed", datetime.now().isoformat(), json.dumps(parts) if parts else None, job_id)
             )
             conn.commit()
+        elif result.returncode == INTERRUPTED_EXIT_CODE:
+            # Stopped with the server, the job stays processing and resumes from its checkpoint at the next startup
+            print(f"Job {job_id} interrupted")
         else:
             # Error
             error_msg = result.stderr or "Unknown error occurred"
@@ -186,6 +473,49 @@ def process_video_task(job_id: str, video_path: str, config: CountingConfig, out
     
     finally:
         conn.close()
+        # New counts were written for this site
+        conn = get_db_connection()
+        ingest_job(conn, job_id, site, csv_path)
+        conn.close()
+        invalidate_forecast(site)
+
+@app.on_event("startup")
+def resume_interrupted_jobs():
+    """Restart jobs left queued or processing by a previous server, they continue from their checkpoints"""
+    if EXECUTION_MODE != "local":
+        return
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM jobs WHERE status IN ('queued', 'processing') AND config_json IS NOT NULL")
+    jobs = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    
+    for job in jobs:
+        if not os.path.exists(job['video_path']):
+            continue
+        print(f"Resuming job {job['job_id']}")
+        config = CountingConfig(**json.loads(job['config_json']))
+        output_video_path = os.path.join(OUTPUT_DIR, f"{job['job_id']}_output.mp4")
+        threading.Thread(target=process_video_task, daemon=True,
+                         args=(job['job_id'], job['video_path'], config, output_video_path,
+                               job['csv_path'], job['site'])).start()
+
+@app.on_event("startup")
+def fail_interrupted_forecasts():
+    """Trainings run in the server process, those of a previous server will not finish and would block new ones"""
+    conn = get_db_connection()
+    conn.execute(
+        "UPDATE forecasts SET status = 'failed', error_message = 'Interrupted by server restart', completed_at = ? "
+        "WHERE status IN ('queued', 'training')",
+        (datetime.now().isoformat(),)
+    )
+    conn.commit()
+    conn.close()
+
+@app.on_event("startup")
+def catch_up_rollups():
+    """Add count rows written while the server was down, e.g. by queue workers"""
+    update_rollups()
 
 # API Endpoints
 @app.post("/api/start-counting", response_model=JobResponse)
@@ -197,7 +527,14 @@ async def start_counting(
     skip_frames: int = Form(...),
     crop: bool = Form(...),
     show_preview: bool = Form(...),
-    interval: int = Form(...)
+    interval: int = Form(...),
+    preview_fps: float = Form(5.0),
+    render_video: bool = Form(True),
+    record_clips: bool = Form(False),
+    segment_seconds: int = Form(0),
+    adaptive_sampling: bool = Form(False),
+    max_stride: int = Form(4),
+    site: str = Form(DEFAULT_SITE)
 ):
     """
     Start a new counting job with uploaded video
@@ -210,7 +547,13 @@ async def start_counting(
             skip_frames=skip_frames,
             crop=crop,
             show_preview=show_preview,
+            preview_fps=preview_fps,
             interval=interval,
+            render_video=render_video,
+            record_clips=record_clips,
+            segment_seconds=segment_seconds,
+            adaptive_sampling=adaptive_sampling,
+            max_stride=max_stride,
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid configuration: {str(e)}")
@@ -229,33 +572,38 @@ async def start_counting(
     # Define output paths
     output_video_path = os.path.join(OUTPUT_DIR, f"{job_id}_output.mp4")
     csv_path = os.path.join(OUTPUT_DIR, f"{job_id}_counts.csv")
+    tracks_path = get_tracks_path(job_id)
     
     # Create database entry
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
         INSERT INTO jobs (job_id, video_path, output_video_path, csv_path, status, 
-                         door_direction, confidence, skip_frames, crop, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                         door_direction, confidence, skip_frames, crop, created_at, site, tracks_path, config_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         job_id,
         str(video_path),
-        output_video_path,
+        output_video_path if config.render_video else None,
         csv_path,
         "queued",
         config.door_direction,
         config.confidence,
         config.skip_frames,
         config.crop,
-        datetime.now().isoformat()
+        datetime.now().isoformat(),
+        site,
+        tracks_path,
+        json.dumps(config.__dict__)
     ))
     conn.commit()
     conn.close()
     
-    # Add background task
+    # Add background task, in queue mode a worker claims the job from the database
     print("Config:", config.__dict__)
     # background_tasks = BackgroundTasks()
-    background_tasks.add_task(process_video_task , job_id, str(video_path), config, output_video_path, csv_path)
+    if EXECUTION_MODE == "local":
+        background_tasks.add_task(process_video_task , job_id, str(video_path), config, output_video_path, csv_path, site)
     # process_video_task(job_id, str(video_path), config, output_video_path, csv_path)
     
     return JobResponse(
@@ -289,8 +637,10 @@ async def get_status(job_id: str):
     return StatusResponse(
         job_id=job['job_id'],
         status=job['status'],
+        site=job['site'],
         video_path=job['video_path'],
         output_video_path=job['output_video_path'],
+        output_video_parts=json.loads(job['output_video_parts']) if job['output_video_parts'] else None,
         csv_path=job['csv_path'],
         latest_data=latest_data,
         error_message=job['error_message'],
@@ -299,9 +649,11 @@ async def get_status(job_id: str):
     )
 
 @app.get("/api/csv-data/{job_id}")
-async def get_csv_data(job_id: str):
+async def get_csv_data(job_id: str, request: Request, shape: Literal["rows", "columns"] = "rows"):
     """
-    Get all CSV data for a job
+    Get all CSV data for a job.
+    shape=columns returns one typed array per column instead of a dict per row.
+    Sent as msgpack if the Accept header asks for it, compressed with brotli or gzip as accepted.
     """
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -319,13 +671,260 @@ async def get_csv_data(job_id: str):
         return {"data": []}
     
     try:
-        with open(csv_path, 'r') as f:
-            reader = csv.DictReader(f)
-            data = list(reader)
-        return {"data": data}
+        count_data = get_count_data(csv_path)
+        with count_data.lock:
+            media_type = negotiate_media_type(request.headers.get("accept", ""))
+            etag = count_data.etag(shape, media_type)
+            headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+            if request.headers.get("if-none-match") == etag:
+                # Dashboards polling an unchanged job get no body
+                return Response(status_code=304, headers=headers)
+            
+            body = count_data.encode(shape, media_type, None)
+            encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), len(body))
+            if encoding:
+                body = count_data.encode(shape, media_type, encoding)
+                headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading CSV: {str(e)}")
 
+@app.get("/api/rollups/{granularity}")
+async def get_rollups(granularity: Literal["hourly", "daily"], site: Optional[str] = None,
+                      start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Get hourly or daily incoming/outgoing totals, for one site or summed over all sites.
+    start (inclusive) and end (exclusive) are "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" strings.
+    """
+    # Rows of running jobs are added on read, finished jobs were added when they completed
+    update_rollups(status="processing")
+    
+    conn = get_db_connection()
+    data = query_rollups(conn, granularity, site, start, end)
+    conn.close()
+    return {"granularity": granularity, "site": site, "data": data}
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Job and counting pipeline metrics in the Prometheus text format
+    """
+    conn = get_db_connection()
+    status_counts = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    finished = conn.execute(
+        "SELECT job_id, status, created_at, completed_at FROM jobs WHERE status IN ('completed', 'failed') AND completed_at >= ?",
+        (SERVER_START,)
+    ).fetchall()
+    running = conn.execute("SELECT job_id FROM jobs WHERE status = 'processing'").fetchall()
+    conn.close()
+
+    with metrics_lock:
+        # A finished job's last snapshot is added to the totals once
+        for job_id, status, created_at, completed_at in finished:
+            if job_id in folded_jobs:
+                continue
+            folded_jobs.add(job_id)
+            # The snapshot's elapsed gauge covers only the last leg of a resumed job
+            duration = datetime.fromisoformat(completed_at) - datetime.fromisoformat(created_at)
+            job_duration_seconds.observe(duration.total_seconds(), status=status)
+            snapshot = load_snapshot(get_metrics_path(job_id))
+            if snapshot:
+                finished_totals.merge(snapshot)
+
+        registry = MetricsRegistry()
+        jobs = registry.gauge('counter_jobs', 'Jobs by status, queued is the queue depth', ['status'])
+        for status, count in status_counts:
+            jobs.set(count, status=status)
+        registry.merge(finished_totals.snapshot())
+        # Running jobs add their counters to the totals and report their gauges per job
+        for (job_id,) in running:
+            snapshot = load_snapshot(get_metrics_path(job_id))
+            if snapshot:
+                registry.merge(snapshot, gauge_labels={'job_id': job_id})
+        registry.merge(server_metrics.snapshot())
+
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/clips/{job_id}")
+async def get_clips(job_id: str):
+    """
+    Get the index of crossing clips recorded for a job
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT job_id FROM jobs WHERE job_id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    index_path = os.path.join(get_clips_dir(job_id), "index.json")
+    if not os.path.exists(index_path):
+        return {"clips_dir": None, "clips": []}
+    
+    with open(index_path, 'r') as f:
+        index = json.load(f)
+    return {"clips_dir": get_clips_dir(job_id), "clips": index['clips']}
+
+def get_job_status(job_id: str) -> Optional[str]:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row['status'] if row else None
+
+@app.get("/api/preview/{job_id}")
+async def get_preview(job_id: str, request: Request, fps: float = 5.0):
+    """
+    Stream the live preview of a running job as MJPEG, usable directly as an <img> source
+    """
+    if get_job_status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    preview_path = get_preview_path(job_id)
+    watch_path = preview_path + ".watch"
+    
+    async def frames():
+        last_mtime = None
+        last_status_check = 0.0
+        while not await request.is_disconnected():
+            # Keep the counter encoding preview frames while this stream is open
+            with open(watch_path, 'a'):
+                os.utime(watch_path)
+            
+            try:
+                mtime = os.stat(preview_path).st_mtime_ns
+                if mtime != last_mtime:
+                    with open(preview_path, 'rb') as f:
+                        jpeg = f.read()
+                    last_mtime = mtime
+                    yield b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n"
+            except FileNotFoundError:
+                pass
+            
+            now = asyncio.get_running_loop().time()
+            if now - last_status_check >= 2.0:
+                last_status_check = now
+                if get_job_status(job_id) not in ("queued", "processing"):
+                    break
+            await asyncio.sleep(1.0 / max(fps, 0.1))
+    
+    return StreamingResponse(frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+@app.get("/api/video/{job_id}")
+async def get_video(job_id: str):
+    """
+    Serve the annotated output video, with Range requests for seeking
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT output_video_path FROM jobs WHERE job_id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not row['output_video_path'] or not os.path.exists(row['output_video_path']):
+        raise HTTPException(status_code=404, detail="Output video not available")
+    
+    # FileResponse answers Range requests, so players can seek
+    return FileResponse(row['output_video_path'], media_type="video/mp4")
+
+@app.get("/api/video/{job_id}/part/{index}")
+async def get_video_part(job_id: str, index: int):
+    """
+    Serve one part of an output video written in parts by a resumed job, listed in output_video_parts
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT output_video_parts FROM jobs WHERE job_id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    parts = json.loads(row['output_video_parts']) if row['output_video_parts'] else []
+    if not 0 <= index < len(parts):
+        raise HTTPException(status_code=404, detail="Video part not found")
+    part_path = os.path.join(OUTPUT_DIR, parts[index])
+    if not os.path.exists(part_path):
+        raise HTTPException(status_code=404, detail="Video part not found")
+    
+    return FileResponse(part_path, media_type="video/mp4")
+
+@app.get("/api/video/{job_id}/playlist.m3u8")
+async def get_video_playlist(job_id: str):
+    """
+    Get the playlist of a segmented output video, it grows while the job runs
+    """
+    playlist_path = get_playlist_path(job_id)
+    if not os.path.exists(playlist_path):
+        raise HTTPException(status_code=404, detail="No segmented video for job")
+    
+    with open(playlist_path, 'r') as f:
+        playlist = f.read()
+    # Segment names are relative, so players fetch them from the segment endpoint below
+    return Response(content=playlist, media_type="application/vnd.apple.mpegurl", headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/video/{job_id}/{segment_name}")
+async def get_video_segment(job_id: str, segment_name: str):
+    """
+    Serve one finished segment of a segmented output video
+    """
+    from segment_writer import read_playlist
+    # Only segments in the playlist are finished, the one being written is not
+    if segment_name not in [name for name, _ in read_playlist(get_playlist_path(job_id))]:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    segment_path = os.path.join(get_segments_dir(job_id), segment_name)
+    if not os.path.exists(segment_path):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    
+    return FileResponse(segment_path, media_type="video/mp4")
+
+@app.post("/api/render/{job_id}", response_model=JobResponse)
+async def render_video(job_id: str, background_tasks: BackgroundTasks):
+    """
+    Render the annotated video of a completed job from its recorded tracks
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job = dict(row)
+    if job['status'] != "completed":
+        raise HTTPException(status_code=409, detail="Job has not completed yet")
+    if job['output_video_path'] and os.path.exists(job['output_video_path']):
+        return JobResponse(job_id=job_id, status="completed", message="Video already rendered")
+    if not job['tracks_path'] or not os.path.exists(job['tracks_path']):
+        raise HTTPException(status_code=404, detail="No recorded tracks for job")
+    
+    output_video_path = os.path.join(OUTPUT_DIR, f"{job_id}_output.mp4")
+    background_tasks.add_task(render_video_task, job_id, job['video_path'], job['tracks_path'],
+                              job['door_direction'], bool(job['crop']), output_video_path)
+    
+    return JobResponse(job_id=job_id, status="rendering", message="Video rendering started")
+
+@app.get("/api/forecast/{site}", response_model=ForecastResponse)
+async def get_forecast(site: str, background_tasks: BackgroundTasks):
+    """
+    Get the next-day forecast for a site, training it in the background if needed
+    """
+    return get_or_start_forecast(site, background_tasks)
+
+@app.post("/api/forecast/{site}", response_model=ForecastResponse)
+async def retrain_forecast(site: str, background_tasks: BackgroundTasks):
+    """
+    Force retraining of the forecast for a site
+    """
+    return get_or_start_forecast(site, background_tasks, force=True)
+
 @app.get("/")
 async def root():
     return {"message": "People Counter API is running"}
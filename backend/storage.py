@@ -0,0 +1,34 @@
+import os
+
+class LocalStorage:
+    """Job artifacts in a directory shared by the server and all workers (local disk or a network mount)
+
+    Artifacts are addressed by keys relative to the root, e.g.
+    "input/<job_id>_video.mp4". get() makes an artifact readable on this node
+    and put() publishes a file written at local_path(). Both are no-ops here
+    since the root is shared; an object store backend would download to and
+    upload from a local cache directory instead.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, key):
+        """Path on this node where the artifact is read or written"""
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def get(self, key):
+        """Make the artifact available locally and return its path"""
+        path = self.local_path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Artifact not found in storage: {key}")
+        return path
+
+    def put(self, key):
+        """Publish the file written at local_path(key)"""
+        return key
+
+def get_storage_key(path):
+    """Storage key of an artifact path recorded by the server: its data directory and file name"""
+    return os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
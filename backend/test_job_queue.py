@@ -0,0 +1,118 @@
+import time
+import sqlite3
+
+import pytest
+
+from job_queue import SQLiteJobQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    """Queue on a temporary database with the columns of the server's jobs table that it uses"""
+    db_path = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT,
+            created_at TEXT,
+            completed_at TEXT,
+            error_message TEXT,
+            config_json TEXT,
+            worker_id TEXT,
+            lease_expires_at REAL,
+            attempts INTEGER DEFAULT 0
+        )
+    """)
+    conn.executemany("INSERT INTO jobs (job_id, status, created_at, config_json) VALUES (?, 'queued', ?, '{}')",
+                     [("job1", "2026-01-01T00:00:00"), ("job2", "2026-01-01T00:00:01")])
+    conn.commit()
+    conn.close()
+    return SQLiteJobQueue(db_path, max_attempts=2)
+
+def get_job(queue, job_id):
+    conn = queue._connect()
+    row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    conn.close()
+    return dict(row)
+
+def expire_lease(queue, job_id):
+    conn = queue._connect()
+    conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE job_id = ?", (time.time() - 1, job_id))
+    conn.close()
+
+def test_claim_oldest_job_once(queue):
+    first = queue.claim("worker-a", 60)
+    second = queue.claim("worker-b", 60)
+    assert first['job_id'] == "job1"
+    assert first['attempts'] == 1
+    assert second['job_id'] == "job2"
+    assert queue.claim("worker-c", 60) is None
+
+def test_claim_skips_jobs_without_config(queue):
+    conn = queue._connect()
+    conn.execute("UPDATE jobs SET config_json = NULL WHERE job_id = 'job1'")
+    conn.close()
+    assert queue.claim("worker-a", 60)['job_id'] == "job2"
+
+def test_expired_lease_is_claimed_by_another_worker(queue):
+    queue.claim("worker-a", 60)
+    expire_lease(queue, "job1")
+    job = queue.claim("worker-b", 60)
+    assert job['job_id'] == "job1"
+    assert job['attempts'] == 2
+    assert get_job(queue, "job1")['worker_id'] == "worker-b"
+
+def test_heartbeat_after_takeover_fails(queue):
+    queue.claim("worker-a", 60)
+    assert queue.heartbeat("job1", "worker-a", 60)
+    expire_lease(queue, "job1")
+    queue.claim("worker-b", 60)
+    assert not queue.heartbeat("job1", "worker-a", 60)
+    assert queue.heartbeat("job1", "worker-b", 60)
+
+def test_finish_by_previous_worker_is_ignored(queue):
+    queue.claim("worker-a", 60)
+    expire_lease(queue, "job1")
+    queue.claim("worker-b", 60)
+    queue.complete("job1", "worker-a")
+    assert get_job(queue, "job1")['status'] == "processing"
+    queue.complete("job1", "worker-b")
+    job = get_job(queue, "job1")
+    assert job['status'] == "completed"
+    assert job['completed_at'] is not None
+
+def test_fail_requeues_until_max_attempts(queue):
+    queue.claim("worker-a", 60)
+    queue.fail("job1", "worker-a", "crashed")
+    job = get_job(queue, "job1")
+    assert job['status'] == "queued"
+    assert job['completed_at'] is None
+
+    assert queue.claim("worker-a", 60)['job_id'] == "job1"
+    queue.fail("job1", "worker-a", "crashed again")
+    job = get_job(queue, "job1")
+    assert job['status'] == "failed"
+    assert job['error_message'] == "crashed again"
+    assert job['completed_at'] is not None
+
+def test_lease_expired_too_many_times_fails(queue):
+    for worker_id in ("worker-a", "worker-b"):
+        assert queue.claim(worker_id, 60)['job_id'] == "job1"
+        expire_lease(queue, "job1")
+    # job1 used up its attempts, so job2 is claimed instead
+    assert queue.claim("worker-c", 60)['job_id'] == "job2"
+    job = get_job(queue, "job1")
+    assert job['status'] == "failed"
+    assert job['completed_at'] is not None
+
+def test_release_keeps_the_attempt(queue):
+    queue.claim("worker-a", 60)
+    queue.release("job1", "worker-a")
+    job = get_job(queue, "job1")
+    assert job['status'] == "queued"
+    assert job['attempts'] == 0
+    assert job['lease_expires_at'] is None
+
+    queue.release("job1", "worker-a")
+    assert get_job(queue, "job1")['attempts'] == 0
+    assert queue.claim("worker-b", 60)['attempts'] == 1
@@ -0,0 +1,138 @@
+import json
+import time
+import cProfile
+
+class NullTracer:
+    """Tracer used when instrumentation is off, every hook is a no-op"""
+    enabled = False
+
+    def begin_frame(self, frame_count):
+        pass
+
+    def mark(self, stage):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def summary(self):
+        return {}
+
+    def close(self):
+        pass
+
+class StageTracer:
+    """Records per-frame wall time of each stage of the counting loop
+
+    Call begin_frame() before reading a frame, mark(stage) after each stage
+    (the time since the previous mark is attributed to that stage) and
+    end_frame() when the frame is done.
+    """
+    enabled = True
+
+    def __init__(self, trace_path=None, profile_path=None, profile_every=100):
+        self.trace_path = trace_path
+        self.profile_path = profile_path
+        self.profile_every = profile_every
+        self.profiler = cProfile.Profile() if profile_path else None
+
+        self.events = []           # (name, start_ns, duration_ns, frame_count), only kept for a trace file
+        self.stage_durations = {}  # stage -> per-frame durations in ns
+        self._frame_stages = {}
+        self._frame_count = 0
+        self._frame_start = 0
+        self._last = 0
+        self._profiling = False
+
+    def begin_frame(self, frame_count):
+        """Start timing a frame"""
+        self._frame_count = frame_count
+        self._frame_stages = {}
+        if self.profiler and frame_count % self.profile_every == 0:
+            self.profiler.enable()
+            self._profiling = True
+        self._frame_start = self._last = time.perf_counter_ns()
+
+    def mark(self, stage):
+        """Attribute the time since the previous mark to a stage"""
+        now = time.perf_counter_ns()
+        duration = now - self._last
+        if self.trace_path:
+            self.events.append((stage, self._last, duration, self._frame_count))
+        self._frame_stages[stage] = self._frame_stages.get(stage, 0) + duration
+        self._last = now
+
+    def end_frame(self):
+        """Finish timing a frame"""
+        if self._profiling:
+            self.profiler.disable()
+            self._profiling = False
+        now = time.perf_counter_ns()
+        if self.trace_path:
+            self.events.append(('frame', self._frame_start, now - self._frame_start, self._frame_count))
+        for stage, duration in self._frame_stages.items():
+            self.stage_durations.setdefault(stage, []).append(duration)
+        self.stage_durations.setdefault('frame', []).append(now - self._frame_start)
+
+    def summary(self):
+        """Per-stage count, mean and p50/p95/p99 in milliseconds"""
+        summary = {}
+        for stage, durations in self.stage_durations.items():
+            ordered = sorted(durations)
+            summary[stage] = {
+                'count': len(ordered),
+                'mean_ms': sum(ordered) / len(ordered) / 1e6,
+                'p50_ms': percentile(ordered, 50) / 1e6,
+                'p95_ms': percentile(ordered, 95) / 1e6,
+                'p99_ms': percentile(ordered, 99) / 1e6,
+            }
+        return summary
+
+    def write_trace(self, trace_path):
+        """Write events in the Chrome/Perfetto trace event format"""
+        trace_events = [{
+            'name': name,
+            'cat': 'frame' if name == 'frame' else 'stage',
+            'ph': 'X',
+            'ts': start / 1000,
+            'dur': duration / 1000,
+            'pid': 1,
+            'tid': 1,
+            'args': {'frame': frame_count},
+        } for name, start, duration, frame_count in self.events]
+
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+    def close(self):
+        """Write trace and profile files and print the stage summary"""
+        summary = self.summary()
+
+        print(f"{'stage':<10}{'frames':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}  [ms]")
+        for stage, stats in summary.items():
+            print(f"{stage:<10}{stats['count']:>8}{stats['mean_ms']:>9.2f}{stats['p50_ms']:>9.2f}"
+                  f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+
+        if self.trace_path:
+            self.write_trace(self.trace_path)
+            summary_path = self.trace_path.rsplit('.', 1)[0] + '_summary.json'
+            with open(summary_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"Trace saved to {self.trace_path} (open in ui.perfetto.dev or chrome://tracing)")
+
+        if self.profiler:
+            self.profiler.dump_stats(self.profile_path)
+            print(f"Profile of every {self.profile_every}th frame saved to {self.profile_path}")
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return 0
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+def create_tracer(trace_path=None, profile_path=None, profile_every=100, stats=False):
+    """Return a StageTracer if any instrumentation is requested, else a NullTracer"""
+    if trace_path or profile_path or stats:
+        return StageTracer(trace_path, profile_path, profile_every)
+    return NullTracer()
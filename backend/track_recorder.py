@@ -0,0 +1,47 @@
+import csv
+
+class TrackRecorder:
+    """Records track positions and counts of each processed frame to CSV
+
+    The recording holds everything the annotated video shows, so it can be
+    rendered later (see annotate.py) instead of while counting.
+    """
+    def __init__(self, tracks_path, state=None):
+        self.tracks_path = tracks_path
+        if state:
+            # Resume: drop frames recorded after the checkpoint and append
+            self.file = open(tracks_path, 'r+', newline='')
+            self.file.truncate(state['tracks_size'])
+            self.file.seek(state['tracks_size'])
+            self.writer = csv.writer(self.file)
+            return
+        
+        self.file = open(tracks_path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['frame', 'total', 'incoming', 'outgoing', 'tracks'])
+    
+    def get_state(self):
+        """File size after flushing, for checkpointing"""
+        self.file.flush()
+        return {'tracks_size': self.file.tell()}
+
+    def record(self, frame_count, counts, track_ids, track_history):
+        """Record one frame, tracks are stored as "id:x:y" separated by ";" """
+        tracks = ';'.join(f"{track_id}:{track_history[track_id][-1][0]}:{track_history[track_id][-1][1]}"
+                          for track_id in track_ids)
+        self.writer.writerow([frame_count, counts['total'], counts['incoming'], counts['outgoing'], tracks])
+
+    def close(self):
+        self.file.close()
+
+def read_tracks(tracks_path):
+    """Yield (frame, counts, [(track_id, x, y), ...]) for each recorded frame"""
+    with open(tracks_path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            counts = {'total': int(row['total']), 'incoming': int(row['incoming']), 'outgoing': int(row['outgoing'])}
+            tracks = []
+            if row['tracks']:
+                for track in row['tracks'].split(';'):
+                    track_id, x, y = track.split(':')
+                    tracks.append((int(track_id), int(x), int(y)))
+            yield int(row['frame']), counts, tracks
@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+
+import cv2
+
+# Frame rate assumed when a live source does not report one
+FALLBACK_FPS = 25.0
+
+class FileSource:
+    """Reads every frame of a finite video file in order"""
+    is_stream = False
+
+    def __init__(self, path):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_index = 0
+        self.dropped_frames = 0
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        """Return (frame, frame_index, capture_time) of the next frame, or None at the end"""
+        success, frame = self.cap.read()
+        if not success:
+            return None
+        self.frame_index += 1
+        return frame, self.frame_index, time.monotonic()
+
+    def skip(self, count):
+        """Advance past count frames without decoding them, returns how many were skipped"""
+        skipped = 0
+        while skipped < count and self.cap.grab():
+            skipped += 1
+        self.frame_index += skipped
+        return skipped
+
+    def seek(self, frame_index):
+        """Continue reading after the given frame"""
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        self.frame_index = frame_index
+
+    def release(self):
+        self.cap.release()
+
+class LatestFrameSource:
+    """Reads a live source on a background thread, keeping only the newest frame
+
+    When processing falls behind, older frames are overwritten instead of
+    queued, so the frame handed out is never more than one capture behind.
+    Supports anything OpenCV/FFmpeg can open (RTSP/HTTP URLs, device
+    indexes, pipes). With realtime=True a local file is replayed at its own
+    frame rate to simulate a camera. Lost connections are reopened.
+    """
+    is_stream = True
+
+    def __init__(self, source, realtime=False, reconnect_attempts=-1, reconnect_delay=1.0):
+        self.source = int(source) if str(source).isdigit() else source
+        self.realtime = realtime
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+
+        self.cap = cv2.VideoCapture(self.source)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or FALLBACK_FPS
+        self.total_frames = None
+
+        self.frame_index = 0      # Frames received from the source, including dropped ones
+        self.dropped_frames = 0   # Frames overwritten before they were processed
+        self.reconnects = 0       # Reconnects over the whole run, for reporting
+        self._outage_attempts = 0 # Reconnect attempts since the last successful read
+
+        self._latest = None
+        self._finished = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        if self.cap.isOpened():
+            self._thread.start()
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def _reconnect(self):
+        """Reopen the source after a failed read, returns False when giving up"""
+        if self.is_file:
+            # End of a replayed file is the end of the stream
+            return False
+        # reconnect_attempts limits each outage, not the whole run
+        while self.reconnect_attempts < 0 or self._outage_attempts < self.reconnect_attempts:
+            self._outage_attempts += 1
+            self.reconnects += 1
+            print(f"Stream lost, reconnecting ({self._outage_attempts})...")
+            self.cap.release()
+            time.sleep(self.reconnect_delay)
+            self.cap = cv2.VideoCapture(self.source)
+            if self.cap.isOpened():
+                return True
+        return False
+
+    def _run(self):
+        replay_start = time.monotonic()
+        while not self._finished:
+            success, frame = self.cap.read()
+            if not success:
+                if self._reconnect():
+                    continue
+                break
+
+            self._outage_attempts = 0
+            self.frame_index += 1
+            if self.realtime and self.is_file:
+                # Pace the replay to the file's own frame rate
+                delay = replay_start + self.frame_index / self.fps - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            with self._condition:
+                if self._latest is not None:
+                    self.dropped_frames += 1
+                self._latest = (frame, self.frame_index, time.monotonic())
+                self._condition.notify()
+
+        with self._condition:
+            self._finished = True
+            self._condition.notify()
+
+    def read(self, timeout=None):
+        """Wait for the newest frame and return (frame, frame_index, capture_time)
+
+        Returns None at the end, or when timeout seconds pass without a new
+        frame (use finished to tell the two apart).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._latest is not None or self._finished, timeout)
+            latest, self._latest = self._latest, None
+        return latest
+
+    @property
+    def finished(self):
+        """Whether the source ended and its last frame was handed out"""
+        with self._condition:
+            return self._finished and self._latest is None
+
+    def skip(self, count):
+        """Live sources always hand out the newest frame, there is nothing to skip"""
+        return 0
+
+    def seek(self, frame_index):
+        """Live sources cannot seek, frame numbering continues from the given frame"""
+        with self._condition:
+            self.frame_index += frame_index
+
+    def release(self):
+        self._finished = True
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+        self.cap.release()
+
+def open_source(args):
+    """Open the video source selected by the command line arguments"""
+    if args.stream or args.realtime:
+        return LatestFrameSource(args.video, realtime=args.realtime, reconnect_attempts=args.reconnect_attempts)
+    return FileSource(args.video)
@@ -0,0 +1,199 @@
+"""
+AI Person Counter Worker
+
+Runs counting jobs queued by the API server (with EXECUTION_MODE=queue).
+Start any number of workers, on one or many machines, against the same jobs
+database and storage root. Each worker claims one job at a time under a
+lease, keeps it with heartbeats and checkpoints the counting, so a job of a
+worker that dies is picked up and resumed by another one.
+
+Created by: Pratik Das
+Date: 2026-10-18
+Version: 1.0
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import sqlite3
+import argparse
+import subprocess
+from dotenv import load_dotenv
+
+from job_queue import SQLiteJobQueue
+from checkpoint import INTERRUPTED_EXIT_CODE, get_output_parts
+from storage import LocalStorage, get_storage_key
+from rollups import ingest_job
+
+load_dotenv()
+
+# Same database and data root as the server, which runs from the backend directory
+DB_PATH = "counter_jobs.db"
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", os.path.dirname(os.getcwd()))
+
+def parse_arguments(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Worker running queued counting jobs')
+    parser.add_argument('--worker_id', type=str, default=f"{socket.gethostname()}-{os.getpid()}", help='Unique name of this worker')
+    parser.add_argument('--db', type=str, default=DB_PATH, help='Path to the jobs database shared with the server')
+    parser.add_argument('--storage_root', type=str, default=STORAGE_ROOT, help='Directory holding the input and output folders, shared with the server')
+    parser.add_argument('--lease', type=float, default=60.0, help='Seconds a claimed job stays leased without a heartbeat')
+    parser.add_argument('--heartbeat', type=float, default=15.0, help='Seconds between heartbeats')
+    parser.add_argument('--poll', type=float, default=2.0, help='Seconds between checks for new jobs when idle')
+    parser.add_argument('--max_attempts', type=int, default=3, help='Attempts before a job is marked failed')
+    parser.add_argument('--exit_when_empty', action='store_true', default=False, help='Exit once no job is left to claim')
+    return parser.parse_args(argv)
+
+def build_counter_command(config, video_path, csv_path, tracks_path, output_video_path, clips_dir, checkpoint_path,
+                          preview_path, metrics_path):
+    """counter.py command line for a job's counting configuration"""
+    cmd = [
+        sys.executable,
+        "counter.py",
+        video_path,
+        config['door_direction'],
+        "--csv_output", csv_path,
+        "--tracks_output", tracks_path,
+        "--skip_frames", str(config['skip_frames']),
+        "--conf", str(config['confidence']),
+        "--interval", str(config['interval']),
+        "--checkpoint", checkpoint_path,
+        "--resume",
+        "--metrics_file", metrics_path
+    ]
+
+    if config['render_video']:
+        cmd.extend(["--output", output_video_path])
+        if config['segment_seconds']:
+            cmd.extend(["--segment_seconds", str(config['segment_seconds'])])
+    elif not config['record_clips']:
+        cmd.append("--count_only")
+    if config['record_clips']:
+        cmd.extend(["--clips_dir", clips_dir])
+    if config['adaptive_sampling']:
+        cmd.extend(["--adaptive", "--max_stride", str(config['max_stride'])])
+    if config['crop']:
+        cmd.append("--crop")
+    if config['show_preview']:
+        cmd.extend(["--preview", preview_path, "--preview_fps", str(config['preview_fps'])])
+    return cmd
+
+def run_job(job, queue, storage, args):
+    """Run one claimed job to completion, heartbeating while counter.py runs"""
+    job_id = job['job_id']
+    config = json.loads(job['config_json'])
+    output_dir = os.path.dirname(get_storage_key(job['csv_path']))
+    keys = {
+        'csv': get_storage_key(job['csv_path']),
+        'tracks': get_storage_key(job['tracks_path']),
+        'output': os.path.join(output_dir, f"{job_id}_output.mp4"),
+        'clips': os.path.join(output_dir, f"{job_id}_clips"),
+        'segments': os.path.join(output_dir, f"{job_id}_output_segments"),
+        'checkpoint': os.path.join(output_dir, f"{job_id}_checkpoint.json"),
+        'preview': os.path.join(output_dir, f"{job_id}_preview.jpg"),
+        'metrics': os.path.join(output_dir, f"{job_id}_metrics.json"),
+        'log': os.path.join(output_dir, f"{job_id}_worker.log"),
+    }
+    print(f"Running job {job_id} (attempt {job['attempts']})")
+
+    try:
+        video_path = storage.get(get_storage_key(job['video_path']))
+    except FileNotFoundError as e:
+        queue.fail(job_id, args.worker_id, str(e))
+        return
+
+    cmd = build_counter_command(config, video_path, storage.local_path(keys['csv']), storage.local_path(keys['tracks']),
+                                storage.local_path(keys['output']), storage.local_path(keys['clips']),
+                                storage.local_path(keys['checkpoint']), storage.local_path(keys['preview']),
+                                storage.local_path(keys['metrics']))
+    print("Command executed:", " ".join(cmd))
+
+    log_path = storage.local_path(keys['log'])
+    with open(log_path, 'w') as log:
+        # Its own session keeps counter.py out of signals sent to the worker's process group,
+        # the worker forwards them itself once it is ready to release the job
+        process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        try:
+            while True:
+                try:
+                    returncode = process.wait(timeout=args.heartbeat)
+                    break
+                except subprocess.TimeoutExpired:
+                    if not queue.heartbeat(job_id, args.worker_id, args.lease):
+                        # The lease expired and another worker took over the job
+                        print(f"Lost lease on job {job_id}, stopping")
+                        process.kill()
+                        process.wait()
+                        return
+        except KeyboardInterrupt:
+            # counter.py saves a checkpoint and exits on SIGINT, then the job goes back to the queue
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            process.send_signal(signal.SIGINT)
+            process.wait()
+            queue.release(job_id, args.worker_id)
+            raise
+
+    for key in keys.values():
+        if os.path.isfile(storage.local_path(key)):
+            storage.put(key)
+    # A resumed job wrote its output video in parts next to the first one
+    parts = get_output_parts(storage.local_path(keys['checkpoint']))
+    for name in parts or []:
+        if os.path.isfile(storage.local_path(os.path.join(output_dir, name))):
+            storage.put(os.path.join(output_dir, name))
+    for directory in (keys['clips'], keys['segments']):
+        if os.path.isdir(storage.local_path(directory)):
+            for name in os.listdir(storage.local_path(directory)):
+                storage.put(os.path.join(directory, name))
+
+    # Counts reach the rollups before the job shows as completed
+    conn = sqlite3.connect(args.db, timeout=30)
+    ingest_job(conn, job_id, job['site'], storage.local_path(keys['csv']))
+    if returncode == 0:
+        conn.execute("UPDATE jobs SET output_video_parts = ? WHERE job_id = ?", (json.dumps(parts) if parts else None, job_id))
+        conn.commit()
+    conn.close()
+
+    if returncode == 0:
+        queue.complete(job_id, args.worker_id)
+        print(f"Job {job_id} completed")
+    elif returncode == INTERRUPTED_EXIT_CODE:
+        # counter.py was stopped and saved a checkpoint, the job goes back to the queue
+        queue.release(job_id, args.worker_id)
+        print(f"Job {job_id} interrupted, released")
+    else:
+        with open(log_path, 'r') as log:
+            error_message = log.read()[-2000:] or "Unknown error occurred"
+        queue.fail(job_id, args.worker_id, error_message)
+        print(f"Job {job_id} failed")
+
+def stop_on_sigterm(signum, frame):
+    """SIGTERM (e.g. from a service manager) stops the worker like Ctrl+C"""
+    raise KeyboardInterrupt
+
+def run_worker(args):
+    """Claim and run jobs until stopped"""
+    queue = SQLiteJobQueue(args.db, args.max_attempts)
+    storage = LocalStorage(args.storage_root)
+    print(f"Worker {args.worker_id} waiting for jobs")
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+    try:
+        while True:
+            job = queue.claim(args.worker_id, args.lease)
+            if job is None:
+                if args.exit_when_empty:
+                    break
+                time.sleep(args.poll)
+                continue
+            run_job(job, queue, storage, args)
+    except KeyboardInterrupt:
+        print("Stopped by user")
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    run_worker(args)
@@ -385,6 +385,19 @@ export default function Home() {
                 </div>
               </div>
 
+              {/* Live Preview */}
+              {config.show_preview && status === 'processing' && (
+                <div className="bg-gray-50 rounded-lg p-6">
+                  <h3 className="text-lg font-semibold text-gray-800 mb-4">Live Preview</h3>
+                  {/* eslint-disable-next-line @next/next/no-img-element */}
+                  <img
+                    src={`${API_BASE}/api/preview/${jobId}`}
+                    alt="Live preview"
+                    className="w-full rounded-lg bg-black"
+                  />
+                </div>
+              )}
+
               {/* Latest Data Display */}
               {latestData && (
                 <div className="bg-indigo-50 rounded-lg p-6">